@@ -4,7 +4,9 @@ from fastapi import FastAPI
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.config import settings
+from app.responses import DefaultJSONResponse
 from app.scheduler import setup_scheduler
+from app.modules.marketdata.service import get_moex_session, close_moex_session
 from app.modules.marketdata.api import router as marketdata_router
 from app.modules.portfolio.api import router as portfolio_router
 
@@ -14,6 +16,9 @@ scheduler = AsyncIOScheduler()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Одна HTTP сессия на всё приложение, чтобы переиспользовать соединения с MOEX
+    app.state.http_session = get_moex_session()
+    
     if settings.scheduler_enabled:
         setup_scheduler(scheduler)
         scheduler.start()
@@ -22,6 +27,8 @@ async def lifespan(app: FastAPI):
     
     if scheduler.running:
         scheduler.shutdown()
+    
+    await close_moex_session()
 
 
 app = FastAPI(
@@ -29,6 +36,7 @@ app = FastAPI(
     description='Low-activity investment service for MOEX',
     version='0.1.0',
     lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
 )
 
 app.include_router(marketdata_router, prefix='/api/v1/marketdata', tags=['MarketData'])
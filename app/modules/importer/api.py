@@ -1,49 +1,126 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from typing import List
+import asyncio
 
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+from starlette.types import Message
+from typing import Awaitable, Callable, Iterator
+
+import orjson
+
+from app.config import settings
 from .service import ImportService
-from .schemas import BrokerStatementResponse, SecurityPositionResponse, ImportStatisticsResponse
+from .schemas import BrokerStatementResponse
 from .models import BrokerStatement, SecurityPosition
 
 
-router = APIRouter(prefix='/import', tags=['import'])
+class _UploadLimitRoute(APIRoute):
+    """Маршрут, отклоняющий слишком большие загрузки до разбора multipart-формы.
+    
+    FastAPI читает и сохраняет форму до вызова обработчика и зависимостей,
+    поэтому размер проверяется здесь, по заголовку и по мере получения тела.
+    """
+    
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+        
+        async def upload_limit_handler(request: Request) -> Response:
+            content_length = request.headers.get('content-length', '')
+            if content_length.isdigit() and int(content_length) > settings.max_upload_size:
+                raise HTTPException(status_code=413, detail='Файл слишком большой')
+            
+            # Без Content-Length (chunked) считаем байты тела по мере чтения
+            receive = request.receive
+            received = 0
+            
+            async def limited_receive() -> Message:
+                nonlocal received
+                message = await receive()
+                received += len(message.get('body', b''))
+                if received > settings.max_upload_size:
+                    raise HTTPException(status_code=413, detail='Файл слишком большой')
+                return message
+            
+            return await handler(Request(request.scope, limited_receive))
+        
+        return upload_limit_handler
+
+
+router = APIRouter(prefix='/import', tags=['import'], route_class=_UploadLimitRoute)
+
+# Один сервис на приложение, чтобы кэш разобранных отчетов переживал запросы
+_IMPORT_SERVICE = ImportService()
 
 
 def get_import_service() -> ImportService:
     """Dependency для получения сервиса импорта"""
-    return ImportService()
-
-
-def _convert_position_to_response(position: SecurityPosition) -> SecurityPositionResponse:
-    """Конвертирует модель позиции в ответ API"""
-    return SecurityPositionResponse(
-        issuer=position.issuer,
-        security_type=position.security_type,
-        trading_code=position.trading_code,
-        isin=position.isin,
-        currency=position.currency,
-        quantity=position.quantity,
-        is_bond=position.is_bond,
-        is_stock=position.is_stock,
-        is_etf=position.is_etf
-    )
-
-
-def _convert_statement_to_response(statement: BrokerStatement) -> BrokerStatementResponse:
-    """Конвертирует модель отчета в ответ API"""
-    return BrokerStatementResponse(
-        account_number=statement.account_number,
-        statement_date=statement.statement_date,
-        total_positions=statement.total_positions,
-        bonds_count=len(statement.bonds),
-        stocks_count=len(statement.stocks),
-        etfs_count=len(statement.etfs),
-        positions=[_convert_position_to_response(pos) for pos in statement.positions]
-    )
-
-
-@router.post('/broker-statement', response_model=BrokerStatementResponse)
+    return _IMPORT_SERVICE
+
+
+# Сигнатуры файлов Excel: XLSX (ZIP-архив) и XLS (OLE2-контейнер)
+_EXCEL_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')
+
+
+async def _check_upload(file: UploadFile) -> None:
+    """Отклоняет неподходящие загрузки до разбора файла (размер проверяет _UploadLimitRoute)"""
+    # Проверяем тип файла
+    if not file.filename or not file.filename.endswith(('.xls', '.xlsx')):
+        raise HTTPException(
+            status_code=400,
+            detail='Поддерживаются только Excel файлы (.xls, .xlsx)'
+        )
+    
+    # Проверяем сигнатуру файла по первым байтам
+    await file.seek(0)
+    header = await file.read(8)
+    await file.seek(0)
+    if not header.startswith(_EXCEL_SIGNATURES):
+        raise HTTPException(status_code=415, detail='Файл не является документом Excel')
+
+
+def _position_to_dict(position: SecurityPosition) -> dict:
+    """Конвертирует модель позиции в словарь в формате SecurityPositionResponse"""
+    return {
+        'issuer': position.issuer,
+        'security_type': position.security_type,
+        'trading_code': position.trading_code,
+        'isin': position.isin,
+        'currency': position.currency,
+        'quantity': position.quantity,
+        'is_bond': position.is_bond,
+        'is_stock': position.is_stock,
+        'is_etf': position.is_etf
+    }
+
+
+def _stream_statement_response(statement: BrokerStatement) -> Iterator[bytes]:
+    """Отдает отчет в формате BrokerStatementResponse по частям, по одной позиции за раз"""
+    header = orjson.dumps({
+        'account_number': statement.account_number,
+        'statement_date': statement.statement_date,
+        'total_positions': statement.total_positions,
+        'bonds_count': len(statement.bonds),
+        'stocks_count': len(statement.stocks),
+        'etfs_count': len(statement.etfs),
+    })
+    
+    # Открываем объект без закрывающей скобки и начинаем массив позиций
+    yield header[:-1] + b',"positions":['
+    
+    for index, position in enumerate(statement.positions):
+        if index:
+            yield b','
+        yield orjson.dumps(_position_to_dict(position))
+    
+    yield b']}'
+
+
+@router.post(
+    '/broker-statement',
+    response_model=None,
+    responses={200: {'model': BrokerStatementResponse}}
+)
 async def upload_broker_statement(
     file: UploadFile = File(...),
     import_service: ImportService = Depends(get_import_service)
@@ -57,22 +134,15 @@ async def upload_broker_statement(
     - Данные о портфеле с разбивкой по типам ценных бумаг
     """
     
-    # Проверяем тип файла
-    if not file.filename or not file.filename.endswith(('.xls', '.xlsx')):
-        raise HTTPException(
-            status_code=400,
-            detail='Поддерживаются только Excel файлы (.xls, .xlsx)'
-        )
+    await _check_upload(file)
     
     try:
-        # Читаем содержимое файла
-        file_bytes = await file.read()
+        # Парсим отчет прямо из временного файла загрузки, не читая его целиком в память,
+        # в рабочем потоке, чтобы не блокировать цикл событий
+        statement = await asyncio.to_thread(import_service.import_from_stream, file.file, file.filename)
         
-        # Парсим отчет
-        statement = import_service.import_from_bytes(file_bytes, file.filename)
-        
-        # Конвертируем в ответ
-        return _convert_statement_to_response(statement)
+        # Отдаем ответ потоком, не собирая список моделей позиций в памяти
+        return StreamingResponse(_stream_statement_response(statement), media_type='application/json')
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -97,19 +167,12 @@ async def validate_broker_statement(
     - Статистику валидации файла
     """
     
-    # Проверяем тип файла
-    if not file.filename or not file.filename.endswith(('.xls', '.xlsx')):
-        raise HTTPException(
-            status_code=400,
-            detail='Поддерживаются только Excel файлы (.xls, .xlsx)'
-        )
+    await _check_upload(file)
     
     try:
-        # Читаем содержимое файла
-        file_bytes = await file.read()
-        
-        # Парсим отчет
-        statement = import_service.import_from_bytes(file_bytes, file.filename)
+        # Парсим отчет прямо из временного файла загрузки, не читая его целиком в память,
+        # в рабочем потоке, чтобы не блокировать цикл событий
+        statement = await asyncio.to_thread(import_service.import_from_stream, file.file, file.filename)
         
         # Валидируем
         validation_result = import_service.validate_statement(statement)
@@ -1,9 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Optional
 from decimal import Decimal
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SecurityPosition:
     """Позиция ценной бумаги из брокерского отчета"""
     issuer: str  # Эмитент
@@ -12,21 +13,32 @@ class SecurityPosition:
     isin: str  # ISIN код
     currency: Optional[str]  # Валюта (может быть пустой)
     quantity: int  # Количество (шт.)
+    # Признаки типа считаются один раз при создании позиции
+    _is_bond: bool = field(init=False, repr=False, compare=False)
+    _is_stock: bool = field(init=False, repr=False, compare=False)
+    _is_etf: bool = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Классифицируем позицию сразу, а не при каждой проверке и сериализации
+        security_type = self.security_type.lower()
+        object.__setattr__(self, '_is_bond', 'облигац' in security_type)
+        object.__setattr__(self, '_is_stock', 'акц' in security_type)
+        object.__setattr__(self, '_is_etf', security_type == 'пиф')
     
     @property
     def is_bond(self) -> bool:
         """Проверяет, является ли позиция облигацией"""
-        return 'облигац' in self.security_type.lower()
+        return self._is_bond
     
     @property
     def is_stock(self) -> bool:
         """Проверяет, является ли позиция акцией"""
-        return 'акц' in self.security_type.lower()
+        return self._is_stock
     
     @property
     def is_etf(self) -> bool:
         """Проверяет, является ли позиция ETF"""
-        return self.security_type.lower() == 'пиф'
+        return self._is_etf
 
 
 @dataclass
@@ -36,20 +48,34 @@ class BrokerStatement:
     positions: list[SecurityPosition]  # Список позиций
     statement_date: Optional[str] = None  # Дата отчета
     
+    @cached_property
+    def _partitioned(self) -> dict[str, list[SecurityPosition]]:
+        """Разбивает позиции по типам за один проход"""
+        partitioned: dict[str, list[SecurityPosition]] = {'bonds': [], 'stocks': [], 'etfs': []}
+        bonds, stocks, etfs = partitioned['bonds'], partitioned['stocks'], partitioned['etfs']
+        for pos in self.positions:
+            if pos._is_bond:
+                bonds.append(pos)
+            if pos._is_stock:
+                stocks.append(pos)
+            if pos._is_etf:
+                etfs.append(pos)
+        return partitioned
+    
     @property
     def bonds(self) -> list[SecurityPosition]:
         """Возвращает только облигации"""
-        return [pos for pos in self.positions if pos.is_bond]
+        return self._partitioned['bonds']
     
     @property
     def stocks(self) -> list[SecurityPosition]:
         """Возвращает только акции"""
-        return [pos for pos in self.positions if pos.is_stock]
+        return self._partitioned['stocks']
     
     @property
     def etfs(self) -> list[SecurityPosition]:
         """Возвращает только ETF"""
-        return [pos for pos in self.positions if pos.is_etf]
+        return self._partitioned['etfs']
     
     @property
     def total_positions(self) -> int:
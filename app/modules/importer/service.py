@@ -1,12 +1,41 @@
-import pandas as pd
+import hashlib
 import re
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Optional, Sequence, Union
 from io import BytesIO
 from pathlib import Path
 
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Нет колеса calamine для платформы - используем openpyxl
+    CalamineWorkbook = None
+
 from .models import SecurityPosition, BrokerStatement
 
 
+# Все маркеры секций одним выражением, чтобы просматривать ячейку один раз
+_MARK_RE = re.compile(r'Сведения о ценных бумагах(?:, Classica)?|Advanced Micro Devices')
+_ACCOUNT_RE = re.compile(r'код счёта: ([\w\d]+)')
+_ACCOUNT_FALLBACK_RE = re.compile(r'№(\w+)')
+
+# Пробелы, встречающиеся в количестве как разделители разрядов
+_STRIP_WS = str.maketrans('', '', ' \t\n\xa0\u2009\u202f')
+
+# Количество колонок с данными позиции (Эмитент ... Остаток)
+POSITION_COLUMNS = 6
+
+
+def _cell_text(cell: Any) -> str:
+    """Возвращает текст ячейки без пробелов по краям ('' для пустой ячейки)"""
+    if cell is None or cell == '':
+        return ''
+    # Числовые ячейки calamine возвращает как float: 12345.0 -> '12345', как у openpyxl и pandas
+    if isinstance(cell, float) and cell.is_integer():
+        cell = int(cell)
+    return str(cell).strip()
+
+
 class BrokerStatementParser:
     """Парсер брокерских отчетов в формате Excel"""
     
@@ -20,14 +49,22 @@ class BrokerStatementParser:
         'Остаток (шт.)'
     ]
     
+    SHEET_NAME = 'Account_Statement_auto_EXC'
+    
+    # Маркеры секций отчета
+    SECTION_MARKER = 'Сведения о ценных бумагах'
+    STOCK_SECTION_MARKER = 'Сведения о ценных бумагах, Classica'
+    FALLBACK_STOCK_MARKER = 'Advanced Micro Devices'
+    
     def __init__(self):
-        self.df: Optional[pd.DataFrame] = None
+        self.rows: list[Sequence[Any]] = []
+        self._layout: dict[str, Optional[int]] = {}
         
     def parse_file(self, file_path: str) -> BrokerStatement:
         """Парсит Excel файл брокерского отчета"""
         try:
-            # Читаем Excel файл
-            self.df = pd.read_excel(file_path, sheet_name='Account_Statement_auto_EXC')
+            # Читаем лист Excel файла в список строк
+            self.rows = self._read_rows(file_path)
             
             # Извлекаем номер счета
             account_number = self._extract_account_number()
@@ -45,12 +82,13 @@ class BrokerStatementParser:
     
     def parse_bytes(self, file_bytes: bytes, filename: str = 'statement.xls') -> BrokerStatement:
         """Парсит Excel файл из байтов"""
+        return self.parse_stream(BytesIO(file_bytes), filename)
+    
+    def parse_stream(self, file_obj: BinaryIO, filename: str = 'statement.xls') -> BrokerStatement:
+        """Парсит Excel файл из файлового объекта, не загружая его целиком в память"""
         try:
-            # Создаем BytesIO объект
-            file_buffer = BytesIO(file_bytes)
-            
-            # Читаем Excel файл из байтов
-            self.df = pd.read_excel(file_buffer, sheet_name='Account_Statement_auto_EXC')
+            # Читаем лист Excel файла из потока в список строк
+            self.rows = self._read_rows(file_obj)
             
             # Извлекаем номер счета
             account_number = self._extract_account_number()
@@ -66,19 +104,59 @@ class BrokerStatementParser:
         except Exception as e:
             raise ValueError(f'Ошибка при парсинге файла {filename}: {str(e)}')
     
+    def _read_rows(self, source: Union[str, BinaryIO]) -> list[Sequence[Any]]:
+        """Читает строки листа отчета из пути или файлового объекта"""
+        if CalamineWorkbook is None:
+            return self._read_rows_openpyxl(source)
+        
+        if isinstance(source, str):
+            workbook = CalamineWorkbook.from_path(source)
+        else:
+            workbook = CalamineWorkbook.from_filelike(source)
+        
+        try:
+            sheet = workbook.get_sheet_by_name(self.SHEET_NAME)
+            # Пустые строки сохраняем, чтобы индексы совпадали с номерами строк листа
+            return sheet.to_python(skip_empty_area=False)
+        finally:
+            workbook.close()
+    
+    def _read_rows_openpyxl(self, source: Union[str, BinaryIO]) -> list[Sequence[Any]]:
+        """Читает строки листа через openpyxl в режиме read-only (только .xlsx)"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            sheet = workbook[self.SHEET_NAME]
+            # Один проход генератором по листу, без построения дерева ячеек
+            return list(sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _is_empty(cell: Any) -> bool:
+        """Проверяет, что ячейка пустая"""
+        return cell is None or cell == ''
+    
+    def _cell(self, row: int, col: int) -> Any:
+        """Возвращает значение ячейки или None, если ее нет"""
+        if row < len(self.rows) and col < len(self.rows[row]):
+            return self.rows[row][col]
+        return None
+    
     def _extract_account_number(self) -> str:
         """Извлекает номер счета из отчета"""
         try:
-            # Ищем в строке 3 (индекс 3) номер счета
-            account_info = str(self.df.iloc[3, 0])
+            # Ищем в строке 4 (индекс 4, первая строка листа - заголовок) номер счета
+            account_info = str(self._cell(4, 0))
             
             # Извлекаем номер счета с помощью регулярного выражения
-            match = re.search(r'код счёта: ([\w\d]+)', account_info)
+            match = _ACCOUNT_RE.search(account_info)
             if match:
                 return match.group(1)
             
             # Если не найден, пробуем другой паттерн
-            match = re.search(r'№(\w+)', account_info)
+            match = _ACCOUNT_FALLBACK_RE.search(account_info)
             if match:
                 return match.group(1)
                 
@@ -91,6 +169,9 @@ class BrokerStatementParser:
         """Извлекает позиции ценных бумаг из отчета"""
         positions = []
         
+        # Находим границы секций один раз для всего отчета
+        self._layout = self._scan_layout()
+        
         # Обрабатываем облигации (строки 8-20 в нашем примере)
         bonds = self._extract_bonds()
         positions.extend(bonds)
@@ -105,25 +186,21 @@ class BrokerStatementParser:
         """Извлекает облигации из отчета"""
         positions = []
         
-        # Ищем секцию с облигациями
-        # В нашем файле это строки 8-20, но нужно найти динамически
-        start_row = self._find_section_start('Сведения о ценных бумагах')
+        # Границы секции с облигациями (в нашем файле строки 8-20) найдены в _scan_layout
+        start_row = self._layout['bond_start']
         if start_row is None:
             return positions
-            
-        # Ищем конец секции (пустая строка или следующая секция)
-        end_row = self._find_section_end(start_row + 2)  # +2 чтобы пропустить заголовки
+        end_row = self._layout['bond_end']
         
-        for i in range(start_row + 1, end_row):  # +1 чтобы пропустить заголовок
+        # +1 чтобы пропустить заголовок
+        for i, row_data in enumerate(self.rows[start_row + 1:end_row], start=start_row + 1):
             try:
-                row_data = self.df.iloc[i]
-                
                 # Проверяем что это не пустая строка и не заголовок
-                if pd.isna(row_data.iloc[0]) or 'Эмитент' in str(row_data.iloc[0]):
+                if not row_data or self._is_empty(row_data[0]) or 'Эмитент' in str(row_data[0]):
                     continue
                 
                 # Проверяем что это облигация
-                security_type = str(row_data.iloc[1]) if len(row_data) > 1 else ''
+                security_type = str(row_data[1]) if len(row_data) > 1 else ''
                 if 'облигац' not in security_type.lower():
                     continue
                 
@@ -142,29 +219,20 @@ class BrokerStatementParser:
         """Извлекает акции и ETF из отчета"""
         positions = []
         
-        # Ищем секцию с акциями (обычно после облигаций)
-        # В нашем файле это начинается со строки 24
-        start_row = self._find_section_start('Сведения о ценных бумагах, Classica')
+        # Секция с акциями идет после облигаций (в нашем файле со строки 24)
+        start_row = self._layout['stock_start']
         if start_row is None:
-            # Пробуем найти по другому паттерну
-            start_row = self._find_row_with_text('Advanced Micro Devices')
-            if start_row is None:
-                return positions
-            start_row -= 1  # Отступаем на заголовок
-        
-        # Обрабатываем все строки до конца данных
-        total_rows = len(self.df)
+            return positions
         
-        for i in range(start_row + 1, total_rows):  # +1 чтобы пропустить заголовок
+        # Обрабатываем все строки до конца данных, +1 чтобы пропустить заголовок
+        for i, row_data in enumerate(self.rows[start_row + 1:], start=start_row + 1):
             try:
-                row_data = self.df.iloc[i]
-                
                 # Проверяем что это не пустая строка и не заголовок
-                if pd.isna(row_data.iloc[0]) or 'Эмитент' in str(row_data.iloc[0]):
+                if not row_data or self._is_empty(row_data[0]) or 'Эмитент' in str(row_data[0]):
                     continue
                 
                 # Проверяем что это не строка с итогом
-                if 'Итого' in str(row_data.iloc[0]):
+                if 'Итого' in str(row_data[0]):
                     break
                 
                 position = self._create_position_from_row(row_data)
@@ -178,22 +246,33 @@ class BrokerStatementParser:
         
         return positions
     
-    def _create_position_from_row(self, row_data) -> Optional[SecurityPosition]:
+    def _create_position_from_row(self, row_data: Sequence[Any]) -> Optional[SecurityPosition]:
         """Создает объект позиции из строки данных"""
         try:
-            # Извлекаем данные из колонок
-            issuer = str(row_data.iloc[0]).strip() if not pd.isna(row_data.iloc[0]) else ''
-            security_type = str(row_data.iloc[1]).strip() if len(row_data) > 1 and not pd.isna(row_data.iloc[1]) else ''
-            trading_code = str(row_data.iloc[2]).strip() if len(row_data) > 2 and not pd.isna(row_data.iloc[2]) else ''
-            isin = str(row_data.iloc[3]).strip() if len(row_data) > 3 and not pd.isna(row_data.iloc[3]) else ''
-            currency = str(row_data.iloc[4]).strip() if len(row_data) > 4 and not pd.isna(row_data.iloc[4]) else None
+            # Берем первые 6 колонок одним срезом, недостающие дополняем пустыми
+            cells = tuple(row_data[:POSITION_COLUMNS])
+            if len(cells) < POSITION_COLUMNS:
+                cells += ('',) * (POSITION_COLUMNS - len(cells))
+            issuer, security_type, trading_code, isin, currency, quantity_cell = cells
             
-            # Извлекаем количество
-            quantity_str = str(row_data.iloc[5]).strip() if len(row_data) > 5 and not pd.isna(row_data.iloc[5]) else '0'
+            # Извлекаем данные из колонок
+            issuer = _cell_text(issuer)
+            security_type = _cell_text(security_type)
+            trading_code = _cell_text(trading_code)
+            isin = _cell_text(isin)
+            currency = _cell_text(currency) or None
             
-            # Очищаем количество от пробелов и преобразуем в число
-            quantity_str = re.sub(r'\s+', '', quantity_str)
-            quantity = int(quantity_str) if quantity_str.isdigit() else 0
+            # Извлекаем количество (числовые ячейки calamine возвращает как float)
+            if isinstance(quantity_cell, float) and quantity_cell.is_integer():
+                quantity = int(quantity_cell)
+            elif isinstance(quantity_cell, int):
+                quantity = quantity_cell
+            else:
+                # Текстовое количество: убираем разделители разрядов и преобразуем в число
+                try:
+                    quantity = int(_cell_text(quantity_cell).translate(_STRIP_WS))
+                except ValueError:
+                    quantity = 0
             
             # Проверяем обязательные поля
             if not issuer or not isin or quantity <= 0:
@@ -212,57 +291,104 @@ class BrokerStatementParser:
             print(f'Ошибка при создании позиции: {e}')
             return None
     
-    def _find_section_start(self, section_name: str) -> Optional[int]:
-        """Находит начало секции по названию"""
-        for i, row in self.df.iterrows():
-            for cell in row:
-                if isinstance(cell, str) and section_name in cell:
-                    return i
-        return None
+    def _is_section_end(self, row_data: Sequence[Any]) -> bool:
+        """Проверяет, завершает ли строка секцию (пустая строка, итог или новая секция)"""
+        # Если вся строка пустая
+        if all(self._is_empty(cell) for cell in row_data):
+            return True
+        
+        first_cell = str(row_data[0])
+        return 'Итого' in first_cell or self.SECTION_MARKER in first_cell
     
-    def _find_section_end(self, start_row: int) -> int:
-        """Находит конец секции (пустая строка или новая секция)"""
-        total_rows = len(self.df)
+    def _scan_layout(self) -> dict[str, Optional[int]]:
+        """Находит границы секций облигаций и акций за один проход по строкам"""
+        bond_start = bond_end = stock_start = fallback_row = None
         
-        for i in range(start_row, total_rows):
-            row_data = self.df.iloc[i]
-            
-            # Если вся строка пустая
-            if row_data.isna().all():
-                return i
+        for i, row_data in enumerate(self.rows):
+            # Конец секции облигаций ищем начиная со второй строки после ее начала
+            if bond_start is not None and bond_end is None and i >= bond_start + 2:
+                if self._is_section_end(row_data):
+                    bond_end = i
             
-            # Если нашли строку с итогом
-            if 'Итого' in str(row_data.iloc[0]):
-                return i
+            for cell in row_data:
+                if not isinstance(cell, str):
+                    continue
+                
+                match = _MARK_RE.search(cell)
+                if match is None:
+                    continue
+                
+                marker = match.group()
+                if marker == self.FALLBACK_STOCK_MARKER:
+                    if fallback_row is None:
+                        fallback_row = i
+                    continue
                 
-            # Если нашли новую секцию
-            if 'Сведения о ценных бумагах' in str(row_data.iloc[0]):
-                return i
+                if bond_start is None:
+                    bond_start = i
+                if marker == self.STOCK_SECTION_MARKER and stock_start is None:
+                    stock_start = i
+            
+            if bond_end is not None and stock_start is not None:
+                break
         
-        return total_rows
-    
-    def _find_row_with_text(self, text: str) -> Optional[int]:
-        """Находит строку содержащую указанный текст"""
-        for i, row in self.df.iterrows():
-            for cell in row:
-                if isinstance(cell, str) and text in cell:
-                    return i
-        return None
+        if bond_start is not None and bond_end is None:
+            bond_end = len(self.rows)
+        
+        if stock_start is None and fallback_row is not None:
+            stock_start = fallback_row - 1  # Отступаем на заголовок
+        
+        return {'bond_start': bond_start, 'bond_end': bond_end, 'stock_start': stock_start}
 
 
 class ImportService:
     """Сервис для импорта данных из брокерских отчетов"""
     
+    # Сколько разобранных отчетов хранить в кэше
+    CACHE_SIZE = 32
+    
     def __init__(self):
-        self.parser = BrokerStatementParser()
+        # Кэш разобранных отчетов по SHA-256 содержимого файла (LRU).
+        # Импорт вызывается из рабочих потоков, поэтому доступ к кэшу под блокировкой
+        self._cache: OrderedDict[bytes, BrokerStatement] = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    @staticmethod
+    def _new_parser() -> BrokerStatementParser:
+        """Парсер хранит состояние разбираемого файла, поэтому на каждый импорт создается свой"""
+        return BrokerStatementParser()
     
     def import_from_file(self, file_path: str) -> BrokerStatement:
         """Импортирует данные из файла"""
-        return self.parser.parse_file(file_path)
+        return self._new_parser().parse_file(file_path)
     
     def import_from_bytes(self, file_bytes: bytes, filename: str = 'statement.xls') -> BrokerStatement:
         """Импортирует данные из байтов файла"""
-        return self.parser.parse_bytes(file_bytes, filename)
+        key = hashlib.sha256(file_bytes).digest()
+        return self._get_or_parse(key, lambda: self._new_parser().parse_bytes(file_bytes, filename))
+    
+    def import_from_stream(self, file_obj: BinaryIO, filename: str = 'statement.xls') -> BrokerStatement:
+        """Импортирует данные из файлового объекта (например, загруженного файла)"""
+        key = hashlib.file_digest(file_obj, 'sha256').digest()
+        file_obj.seek(0)
+        return self._get_or_parse(key, lambda: self._new_parser().parse_stream(file_obj, filename))
+    
+    def _get_or_parse(self, key: bytes, parse: Callable[[], BrokerStatement]) -> BrokerStatement:
+        """Возвращает отчет из кэша или разбирает его и кладет в кэш"""
+        with self._cache_lock:
+            statement = self._cache.get(key)
+            if statement is not None:
+                self._cache.move_to_end(key)
+                return statement
+        
+        # Разбор выполняется вне блокировки, чтобы разные файлы обрабатывались параллельно
+        statement = parse()
+        
+        with self._cache_lock:
+            self._cache[key] = statement
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return statement
     
     def validate_statement(self, statement: BrokerStatement) -> dict:
         """Валидирует импортированные данные"""
@@ -1,31 +1,50 @@
 from typing import List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 
 from app.modules.marketdata.service import MarketDataService
-from app.modules.marketdata.schemas import Security, Quote
+from app.modules.marketdata.schemas import Security, QuoteResponse
 from app.storage import get_data_manager, DataManager
 
 router = APIRouter()
 
 
-def get_marketdata_service(data_manager: DataManager = Depends(get_data_manager)) -> MarketDataService:
-    return MarketDataService(data_manager)
+def get_marketdata_service(
+    request: Request,
+    data_manager: DataManager = Depends(get_data_manager)
+) -> MarketDataService:
+    return MarketDataService(data_manager, request.app.state.http_session)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет If-None-Match: список тегов через запятую или '*', сравнение слабое (без W/)"""
+    if not if_none_match:
+        return False
+    opaque_tag = etag.removeprefix('W/')
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == opaque_tag:
+            return True
+    return False
 
 
 @router.get('/securities', response_model=List[Security])
 async def get_securities(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     service: MarketDataService = Depends(get_marketdata_service)
 ):
     """Получение списка ценных бумаг из локального хранилища"""
-    try:
-        securities = await service.get_securities(skip=skip, limit=limit)
-        return securities
-    finally:
-        await service.close()
+    etag = service.get_securities_etag(skip=skip, limit=limit)
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    
+    response.headers['ETag'] = etag
+    securities = await service.get_securities(skip=skip, limit=limit)
+    return securities
 
 
 @router.post('/securities/sync')
@@ -40,8 +59,6 @@ async def sync_securities(
         return {'message': f'Synchronized {count} securities from MOEX'}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await service.close()
 
 
 @router.get('/securities/{secid}/info')
@@ -57,8 +74,6 @@ async def get_security_info(
         return info
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await service.close()
 
 
 @router.post('/quotes/{secid}/sync')
@@ -93,8 +108,6 @@ async def sync_quotes_for_security(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await service.close()
 
 
 @router.post('/quotes/current/update')
@@ -108,8 +121,6 @@ async def update_current_prices(
         return {'message': f'Updated current prices for {count} securities'}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await service.close()
 
 
 @router.get('/quotes/current')
@@ -123,33 +134,25 @@ async def get_current_quotes(
         return quotes
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await service.close()
 
 
-@router.get('/quotes/{secid}/latest', response_model=Quote)
+@router.get('/quotes/{secid}/latest', response_model=QuoteResponse)
 async def get_latest_quote(
     secid: str,
     service: MarketDataService = Depends(get_marketdata_service)
 ):
     """Получение последней котировки из локального хранилища"""
-    try:
-        quote = await service.get_latest_quote(secid)
-        if not quote:
-            raise HTTPException(status_code=404, detail='Quote not found')
-        return quote
-    finally:
-        await service.close()
+    quote = await service.get_latest_quote(secid)
+    if not quote:
+        raise HTTPException(status_code=404, detail='Quote not found')
+    return quote
 
 
-@router.get('/quotes/{secid}/history', response_model=List[Quote])
+@router.get('/quotes/{secid}/history', response_model=List[QuoteResponse])
 async def get_quotes_history(
     secid: str,
     service: MarketDataService = Depends(get_marketdata_service)
 ):
     """Получение истории котировок из локального хранилища"""
-    try:
-        quotes = await service.get_quotes_history(secid)
-        return quotes
-    finally:
-        await service.close()
+    quotes = await service.get_quotes_history(secid)
+    return quotes
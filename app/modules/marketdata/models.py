@@ -1,10 +1,11 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional
-from pydantic import BaseModel
 
 
-class Security(BaseModel):
+@dataclass(slots=True, frozen=True)
+class Security:
     secid: str
     name: str
     isin: Optional[str] = None
@@ -12,10 +13,11 @@ class Security(BaseModel):
     market: Optional[str] = None
     board: Optional[str] = None
     is_active: bool = True
-    created_at: datetime = datetime.now()
+    created_at: datetime = field(default_factory=datetime.now)
 
 
-class Quote(BaseModel):
+@dataclass(slots=True, frozen=True)
+class Quote:
     secid: str
     timestamp: datetime
     price: Decimal
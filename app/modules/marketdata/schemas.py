@@ -2,7 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
 
 
 class SecurityBase(BaseModel):
@@ -38,6 +38,12 @@ class QuoteBase(BaseModel):
     close_price: Optional[Decimal] = None
     volume: Optional[Decimal] = None
     value: Optional[Decimal] = None
+    
+    @field_serializer('open_price', 'high_price', 'low_price', 'close_price', 'volume', 'value', when_used='json')
+    def serialize_decimal(self, value: Optional[Decimal]) -> Optional[float]:
+        # Храним Decimal, а в JSON-ответ отдаем float: orjson пишет его нативно, без str(Decimal);
+        # model_dump() в режиме python оставляет Decimal без потери точности
+        return float(value) if value is not None else None
 
 
 class QuoteCreate(QuoteBase):
@@ -52,3 +58,22 @@ class Quote(QuoteBase):
     
     class Config:
         from_attributes = True
+
+
+class QuoteResponse(BaseModel):
+    """Котировка из локального хранилища (models.Quote) в ответе API"""
+    
+    secid: str
+    timestamp: datetime
+    price: Decimal
+    volume: Optional[Decimal] = None
+    bid: Optional[Decimal] = None
+    ask: Optional[Decimal] = None
+    
+    @field_serializer('price', 'volume', 'bid', 'ask', when_used='json')
+    def serialize_decimal(self, value: Optional[Decimal]) -> Optional[float]:
+        # В JSON-ответ отдаем float: orjson пишет его нативно, без str(Decimal)
+        return float(value) if value is not None else None
+    
+    class Config:
+        from_attributes = True
@@ -1,9 +1,13 @@
-from typing import List, Optional
-from datetime import datetime
+import asyncio
+import logging
+from time import monotonic
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, time
 from decimal import Decimal
 
 import aiomoex
 import aiohttp
+import orjson
 
 from app.config import settings
 from app.modules.marketdata.models import Security, Quote
@@ -11,20 +15,110 @@ from app.storage import DataManager
 from app.modules.marketdata.schemas import SecurityCreate, QuoteCreate
 
 
+logger = logging.getLogger(__name__)
+
+
+_ZERO = Decimal('0')
+
+
+def _dec(value, default: Optional[Decimal] = _ZERO) -> Optional[Decimal]:
+    """Преобразует число из ответа MOEX в Decimal (default для пустых значений)"""
+    if not value:
+        return default
+    if isinstance(value, (int, str)):
+        return Decimal(value)
+    # float переводим через repr, чтобы получить кратчайшее десятичное представление
+    return Decimal(repr(value))
+
+
+# Кэш справочных данных MOEX: ключ -> (момент истечения, значение)
+_REFERENCE_CACHE: Dict[tuple, Tuple[float, Any]] = {}
+REFERENCE_CACHE_SIZE = 4096
+SECURITIES_TTL = 300
+SECURITY_INFO_TTL = 3600
+
+
+def _cache_get(key: tuple) -> Optional[Any]:
+    """Возвращает значение из кэша, если срок его жизни не истек"""
+    cached = _REFERENCE_CACHE.get(key)
+    if cached is None or cached[0] < monotonic():
+        return None
+    return cached[1]
+
+
+def _cache_put(key: tuple, value: Any, ttl: float) -> None:
+    """Кладет значение в кэш, вытесняя самую старую запись при переполнении"""
+    _REFERENCE_CACHE.pop(key, None)
+    _REFERENCE_CACHE[key] = (monotonic() + ttl, value)
+    if len(_REFERENCE_CACHE) > REFERENCE_CACHE_SIZE:
+        del _REFERENCE_CACHE[next(iter(_REFERENCE_CACHE))]
+
+
+def clear_reference_cache() -> None:
+    """Сбрасывает кэш справочных данных MOEX"""
+    _REFERENCE_CACHE.clear()
+
+
+class _OrjsonResponse(aiohttp.ClientResponse):
+    """Ответ aiohttp, разбирающий JSON через orjson (в том числе внутри aiomoex)"""
+    
+    async def json(self, *, encoding=None, loads=orjson.loads, content_type='application/json'):
+        return await super().json(encoding=encoding, loads=loads, content_type=content_type)
+
+
+# Общая HTTP сессия для всех обращений к MOEX (API и планировщик)
+_SESSION: Optional[aiohttp.ClientSession] = None
+
+
+def get_moex_session() -> aiohttp.ClientSession:
+    """Возвращает общую aiohttp сессию, создавая ее при первом обращении"""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=settings.moex_max_connections,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        # Accept-Encoding (gzip, deflate и br при установленном brotli) aiohttp
+        # выставляет сам и распаковывает ответы автоматически
+        _SESSION = aiohttp.ClientSession(
+            connector=connector,
+            response_class=_OrjsonResponse,
+            timeout=aiohttp.ClientTimeout(total=30, connect=5),
+            headers={'User-Agent': f'{settings.app_name.lower()}/0.1.0'}
+        )
+    return _SESSION
+
+
+async def close_moex_session() -> None:
+    """Закрывает общую aiohttp сессию (при остановке приложения)"""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+
 class MOEXAdapter:
     """Адаптер для работы с MOEX API через библиотеку aiomoex"""
     
-    def __init__(self):
-        self.session = None
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        # Сессия принадлежит приложению и адаптером не закрывается
+        self.session = session
     
     async def _get_session(self):
-        """Получение или создание aiohttp сессии"""
+        """Получение aiohttp сессии (по умолчанию общей для приложения)"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = get_moex_session()
         return self.session
     
     async def get_securities(self, engine: str = 'stock', market: str = 'shares') -> List[dict]:
         """Получение списка ценных бумаг с MOEX"""
+        cache_key = ('securities', engine, market)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             session = await self._get_session()
             
@@ -51,10 +145,11 @@ class MOEXAdapter:
                     'sectorid': sec.get('SECTORID', '')
                 })
             
+            _cache_put(cache_key, result, SECURITIES_TTL)
             return result
             
         except Exception as e:
-            print(f'Error fetching securities from MOEX: {e}')
+            logger.error('Error fetching securities from MOEX: %s', e)
             return []
     
     async def get_quotes(self, secid: str, from_date: Optional[datetime] = None, 
@@ -86,40 +181,66 @@ class MOEXAdapter:
             return result
             
         except Exception as e:
-            print(f'Error fetching quotes for {secid}: {e}')
+            logger.error('Error fetching quotes for %s: %s', secid, e)
             return []
     
+    async def _get_marketdata(self, session: aiohttp.ClientSession, secid: str) -> List[dict]:
+        """Получение таблицы marketdata для одной ценной бумаги в основном режиме торгов"""
+        # Без режима торгов MOEX возвращает по строке на каждый режим, где торгуется бумага
+        url = (f'{settings.moex_api_url}/iss/engines/stock/markets/shares/'
+               f'boards/{settings.moex_board}/securities/{secid}.json')
+        data = await aiomoex.ISSClient(session, url, {'iss.only': 'marketdata'}).get()
+        return data.get('marketdata', [])
+    
     async def get_current_quotes(self, securities: List[str]) -> List[dict]:
         """Получение текущих котировок для списка ценных бумаг"""
         try:
             session = await self._get_session()
             
-            quotes = await aiomoex.get_market_quotes(
-                session=session,
-                securities=securities
+            # Запросы по всем бумагам выполняются параллельно в одной сессии,
+            # но не больше moex_max_connections одновременно
+            semaphore = asyncio.Semaphore(settings.moex_max_connections)
+            
+            async def get_marketdata(secid: str) -> List[dict]:
+                async with semaphore:
+                    return await self._get_marketdata(session, secid)
+            
+            responses = await asyncio.gather(
+                *(get_marketdata(secid) for secid in securities),
+                return_exceptions=True
             )
             
             result = []
-            for quote in quotes:
-                result.append({
-                    'secid': quote.get('SECID', ''),
-                    'price': quote.get('LAST', 0),
-                    'bid': quote.get('BID', 0),
-                    'ask': quote.get('OFFER', 0),
-                    'volume': quote.get('VOLTODAY', 0),
-                    'change': quote.get('CHANGE', 0),
-                    'change_percent': quote.get('CHANGEPRCNT', 0),
-                    'timestamp': quote.get('UPDATETIME', '')
-                })
+            for secid, quotes in zip(securities, responses):
+                if isinstance(quotes, Exception):
+                    logger.warning('Error fetching current quote for %s: %s', secid, quotes)
+                    continue
+                
+                for quote in quotes:
+                    result.append({
+                        'secid': quote.get('SECID', ''),
+                        'price': quote.get('LAST', 0),
+                        'bid': quote.get('BID', 0),
+                        'ask': quote.get('OFFER', 0),
+                        'volume': quote.get('VOLTODAY', 0),
+                        'change': quote.get('CHANGE', 0),
+                        'change_percent': quote.get('LASTTOPREVPRICE', 0),
+                        'timestamp': quote.get('UPDATETIME', '')
+                    })
             
             return result
             
         except Exception as e:
-            print(f'Error fetching current quotes: {e}')
+            logger.error('Error fetching current quotes: %s', e)
             return []
     
     async def get_security_info(self, secid: str) -> Optional[dict]:
         """Получение подробной информации о ценной бумаге"""
+        cache_key = ('security_info', secid)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             session = await self._get_session()
             
@@ -129,7 +250,7 @@ class MOEXAdapter:
             )
             
             if info:
-                return {
+                result = {
                     'secid': info.get('SECID', ''),
                     'name': info.get('NAME', ''),
                     'shortname': info.get('SHORTNAME', ''),
@@ -146,29 +267,33 @@ class MOEXAdapter:
                     'groupname': info.get('GROUPNAME', ''),
                     'emitter_id': info.get('EMITTER_ID', '')
                 }
+                _cache_put(cache_key, result, SECURITY_INFO_TTL)
+                return result
             
             return None
             
         except Exception as e:
-            print(f'Error fetching security info for {secid}: {e}')
+            logger.error('Error fetching security info for %s: %s', secid, e)
             return None
     
     async def close(self):
-        """Закрытие HTTP сессии"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """Освобождение HTTP сессии (общая сессия закрывается при остановке приложения)"""
+        self.session = None
 
 
 class MarketDataService:
 
-    def __init__(self, data_manager: DataManager):
+    def __init__(self, data_manager: DataManager, session: Optional[aiohttp.ClientSession] = None):
         self.data_manager = data_manager
-        self.moex_adapter = MOEXAdapter()
+        self.moex_adapter = MOEXAdapter(session)
     
     async def get_securities(self, skip: int = 0, limit: int = 100) -> List[Security]:
         """Получение ценных бумаг из локального хранилища"""
-        securities = self.data_manager.get_all_securities()
-        return securities[skip:skip + limit]
+        return self.data_manager.get_securities(skip=skip, limit=limit)
+    
+    def get_securities_etag(self, skip: int = 0, limit: int = 100) -> str:
+        """ETag страницы списка ценных бумаг"""
+        return f'W/"{self.data_manager.get_securities_version()}-{skip}-{limit}"'
     
     async def create_security(self, security_data: SecurityCreate) -> Security:
         """Создание новой ценной бумаги в локальном хранилище"""
@@ -186,28 +311,28 @@ class MarketDataService:
     async def sync_securities_from_moex(self, engine: str = 'stock', market: str = 'shares') -> int:
         """Синхронизация ценных бумаг с MOEX"""
         securities_data = await self.moex_adapter.get_securities(engine=engine, market=market)
-        count = 0
+        
+        # Одна бумага торгуется на нескольких режимах - берём первую запись по secid;
+        # уже известные бумаги отсеивает сам add_securities
+        seen = set()
+        new_securities = []
         
         for sec_data in securities_data:
             if isinstance(sec_data, dict):
                 secid = sec_data.get('secid', '')
-                name = sec_data.get('shortname', '') or sec_data.get('secname', '')
-                isin = sec_data.get('isin', None)
-                board = sec_data.get('boardid', None)
                 
-                if secid and not self.data_manager.security_exists(secid):
-                    security = Security(
+                if secid and secid not in seen:
+                    seen.add(secid)
+                    new_securities.append(Security(
                         secid=secid, 
-                        name=name,
-                        isin=isin,
+                        name=sec_data.get('shortname', '') or sec_data.get('secname', ''),
+                        isin=sec_data.get('isin', None),
                         engine=engine,
                         market=market,
-                        board=board
-                    )
-                    self.data_manager.add_security(security)
-                    count += 1
+                        board=sec_data.get('boardid', None)
+                    ))
         
-        return count
+        return self.data_manager.add_securities(new_securities)
     
     async def get_security_info(self, secid: str) -> Optional[dict]:
         """Получение подробной информации о ценной бумаге с MOEX"""
@@ -217,37 +342,37 @@ class MarketDataService:
                                      to_date: Optional[datetime] = None) -> int:
         """Синхронизация котировок для конкретной ценной бумаги"""
         quotes_data = await self.moex_adapter.get_quotes(secid, from_date, to_date)
-        count = 0
+        quotes = []
+        now = datetime.now()
         
         for quote_data in quotes_data:
             if len(quote_data) >= 3:
                 try:
                     timestamp_str = quote_data[0]
-                    open_price = Decimal(str(quote_data[1])) if quote_data[1] else Decimal('0')
-                    close_price = Decimal(str(quote_data[2])) if quote_data[2] else Decimal('0')
-                    high_price = Decimal(str(quote_data[3])) if len(quote_data) > 3 and quote_data[3] else Decimal('0')
-                    low_price = Decimal(str(quote_data[4])) if len(quote_data) > 4 and quote_data[4] else Decimal('0')
-                    volume = Decimal(str(quote_data[6])) if len(quote_data) > 6 and quote_data[6] else Decimal('0')
+                    close_price = _dec(quote_data[2])
+                    high_price = _dec(quote_data[3]) if len(quote_data) > 3 else _ZERO
+                    low_price = _dec(quote_data[4]) if len(quote_data) > 4 else _ZERO
+                    volume = _dec(quote_data[6]) if len(quote_data) > 6 else _ZERO
                     
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00')) if timestamp_str else datetime.now()
+                    # С Python 3.11 fromisoformat сам разбирает суффикс 'Z'
+                    timestamp = datetime.fromisoformat(timestamp_str) if timestamp_str else now
                     
-                    quote = Quote(
+                    quotes.append(Quote(
                         secid=secid,
                         timestamp=timestamp,
                         price=close_price,
                         volume=volume,
                         bid=low_price,
                         ask=high_price
-                    )
-                    
-                    self.data_manager.add_quote(quote)
-                    count += 1
+                    ))
                     
                 except (ValueError, TypeError) as e:
-                    print(f'Error parsing quote data for {secid}: {e}')
+                    logger.debug('Error parsing quote data for %s: %s', secid, e)
                     continue
         
-        return count
+        # Сохраняем все котировки одним вызовом
+        self.data_manager.add_quotes(secid, quotes)
+        return len(quotes)
     
     async def get_current_quotes(self, securities: List[str]) -> List[dict]:
         """Получение текущих котировок с MOEX"""
@@ -258,6 +383,10 @@ class MarketDataService:
         current_quotes = await self.get_current_quotes(securities)
         count = 0
         
+        # MOEX отдает только время обновления, дату берем текущую один раз на всю пачку
+        now = datetime.now()
+        today = now.date()
+        
         for quote_data in current_quotes:
             try:
                 secid = quote_data.get('secid')
@@ -270,31 +399,26 @@ class MarketDataService:
                 if secid and price:
                     if timestamp_str:
                         try:
-                            timestamp = datetime.strptime(timestamp_str, '%H:%M:%S')
-                            timestamp = timestamp.replace(
-                                year=datetime.now().year,
-                                month=datetime.now().month,
-                                day=datetime.now().day
-                            )
+                            timestamp = datetime.combine(today, time.fromisoformat(timestamp_str))
                         except ValueError:
-                            timestamp = datetime.now()
+                            timestamp = now
                     else:
-                        timestamp = datetime.now()
+                        timestamp = now
                     
                     quote = Quote(
                         secid=secid,
                         timestamp=timestamp,
-                        price=Decimal(str(price)),
-                        volume=Decimal(str(volume)) if volume else None,
-                        bid=Decimal(str(bid)) if bid else None,
-                        ask=Decimal(str(ask)) if ask else None
+                        price=_dec(price),
+                        volume=_dec(volume, None),
+                        bid=_dec(bid, None),
+                        ask=_dec(ask, None)
                     )
                     
                     self.data_manager.add_quote(quote)
                     count += 1
                     
             except (ValueError, TypeError) as e:
-                print(f'Error processing current quote: {e}')
+                logger.warning('Error processing current quote: %s', e)
                 continue
         
         return count
@@ -303,7 +427,7 @@ class MarketDataService:
         """Получение последней котировки из локального хранилища"""
         return self.data_manager.get_latest_quote(secid)
     
-    async def get_quotes_history(self, secid: str) -> List[Quote]:
+    async def get_quotes_history(self, secid: str) -> Sequence[Quote]:
         """Получение истории котировок из локального хранилища"""
         return self.data_manager.get_quotes(secid)
     
@@ -1,6 +1,7 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
+from pydantic import TypeAdapter
 
 from app.modules.portfolio.service import PortfolioService
 from app.modules.portfolio.schemas import (
@@ -11,6 +12,9 @@ from app.storage import get_data_manager, DataManager
 
 router = APIRouter()
 
+# Готовый валидатор/сериализатор списка позиций: JSON строится за один проход в pydantic-core
+_POSITIONS_ADAPTER = TypeAdapter(List[Position])
+
 
 def get_portfolio_service(data_manager: DataManager = Depends(get_data_manager)) -> PortfolioService:
     return PortfolioService(data_manager)
@@ -60,7 +64,9 @@ async def get_portfolio_positions(
     portfolio_id: int,
     service: PortfolioService = Depends(get_portfolio_service)
 ):
-    return await service.get_portfolio_positions(portfolio_id)
+    positions = await service.get_portfolio_positions(portfolio_id)
+    validated = _POSITIONS_ADAPTER.validate_python(positions, from_attributes=True)
+    return Response(content=_POSITIONS_ADAPTER.dump_json(validated), media_type='application/json')
 
 
 @router.post('/positions', response_model=Position)
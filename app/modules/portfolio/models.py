@@ -1,21 +1,23 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional
-from pydantic import BaseModel
 
 
-class Portfolio(BaseModel):
+@dataclass(slots=True)
+class Portfolio:
     id: int
     name: str
     description: Optional[str] = None
     total_value: Decimal = Decimal('0')
     cash_balance: Decimal = Decimal('0')
     is_active: bool = True
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
 
 
-class Position(BaseModel):
+@dataclass(slots=True)
+class Position:
     id: int
     portfolio_id: int
     secid: str
@@ -26,5 +28,5 @@ class Position(BaseModel):
     unrealized_pnl: Optional[Decimal] = None
     target_weight: Optional[Decimal] = None
     actual_weight: Optional[Decimal] = None
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
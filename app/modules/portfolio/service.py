@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from decimal import Decimal
 
 from app.modules.portfolio.models import Portfolio, Position
@@ -28,10 +28,9 @@ class PortfolioService:
         return self.data_manager.get_portfolio(portfolio_id)
     
     async def get_portfolios(self, skip: int = 0, limit: int = 100) -> List[Portfolio]:
-        portfolios = self.data_manager.get_all_portfolios()
-        return portfolios[skip:skip + limit]
+        return self.data_manager.get_portfolios(skip=skip, limit=limit)
     
-    async def get_portfolio_positions(self, portfolio_id: int) -> List[Position]:
+    async def get_portfolio_positions(self, portfolio_id: int) -> Sequence[Position]:
         return self.data_manager.get_positions_for_portfolio(portfolio_id)
     
     async def create_position(self, position_data: PositionCreate) -> Position:
@@ -51,28 +50,66 @@ class PortfolioService:
         position = self.data_manager.get_position(position_id)
         
         if position:
-            position.market_price = market_price
-            position.market_value = position.quantity * market_price
-            
-            if position.avg_price:
-                position.unrealized_pnl = (market_price - position.avg_price) * position.quantity
+            self._apply_market_price(position, market_price)
+            self.data_manager.touch_positions(position.portfolio_id)
         
         return position
     
+    async def update_positions_market_data(self, portfolio_id: int,
+                                           prices: Optional[Dict[str, Decimal]] = None) -> List[Position]:
+        """Обновление рыночных данных всех позиций портфеля за один проход"""
+        positions = self.data_manager.get_positions_for_portfolio(portfolio_id)
+        
+        if prices is None:
+            # Последние котировки берем по одному разу на бумагу
+            prices = {}
+            for secid in {position.secid for position in positions}:
+                quote = self.data_manager.get_latest_quote(secid)
+                if quote:
+                    prices[secid] = quote.price
+        
+        updated = []
+        for position in positions:
+            market_price = prices.get(position.secid)
+            if market_price is not None:
+                self._apply_market_price(position, market_price)
+                updated.append(position)
+        
+        if updated:
+            self.data_manager.touch_positions(portfolio_id)
+        return updated
+    
+    @staticmethod
+    def _apply_market_price(position: Position, market_price: Decimal) -> None:
+        position.market_price = market_price
+        position.market_value = position.quantity * market_price
+        
+        if position.avg_price:
+            position.unrealized_pnl = (market_price - position.avg_price) * position.quantity
+    
     async def get_portfolio_summary(self, portfolio_id: int) -> Optional[PortfolioSummary]:
+        # Сводка пересчитывается только после изменения позиций портфеля
+        version = self.data_manager.get_positions_version(portfolio_id)
+        summary = self.data_manager.get_cached_summary(portfolio_id, version)
+        if summary is not None:
+            return summary
+        
         portfolio = await self.get_portfolio(portfolio_id)
         if not portfolio:
             return None
         
         positions = await self.get_portfolio_positions(portfolio_id)
-        total_unrealized_pnl = Decimal('0')
-        for position in positions:
-            if position.unrealized_pnl:
-                total_unrealized_pnl += position.unrealized_pnl
+        # Суммируем в Decimal встроенным sum, без numpy: точность денежных сумм важнее
+        total_unrealized_pnl = sum(
+            (position.unrealized_pnl for position in positions if position.unrealized_pnl),
+            Decimal('0')
+        )
         
-        return PortfolioSummary(
+        summary = PortfolioSummary(
             portfolio=portfolio,
             positions=positions,
             total_unrealized_pnl=total_unrealized_pnl,
             positions_count=len(positions)
         )
+        self.data_manager.cache_summary(portfolio_id, version, summary)
+        return summary
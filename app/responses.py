@@ -0,0 +1,23 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def _orjson_default(obj: Any) -> Any:
+    """Сериализация типов, которые orjson не поддерживает напрямую"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+class DefaultJSONResponse(ORJSONResponse):
+    """JSON-ответ через orjson с поддержкой Decimal"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
@@ -1,11 +1,21 @@
+import asyncio
+import logging
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 
-from app.modules.marketdata.service import MarketDataService
+from app.config import settings
+from app.modules.marketdata.service import MarketDataService, clear_reference_cache
 from app.storage import DataManager
 
 
+logger = logging.getLogger(__name__)
+
+# Максимальная длительность загрузки котировок за один запуск, секунды
+SYNC_TIMEOUT = 600
+
+
 def setup_scheduler(scheduler: AsyncIOScheduler):
     
     scheduler.add_job(
@@ -21,7 +31,10 @@ async def daily_market_data_update():
     """Ежедневное обновление рыночных данных с MOEX."""
     from datetime import datetime, timedelta
     
-    print(f'Starting daily market data update at {datetime.now()}')
+    logger.info('Starting daily market data update')
+    
+    # Справочные данные MOEX обновляем не реже раза в день
+    clear_reference_cache()
     
     try:
         data_manager = DataManager()
@@ -30,45 +43,61 @@ async def daily_market_data_update():
         securities = await market_service.get_securities()
         
         if not securities:
-            print('No securities found in local storage, loading from MOEX...')
+            logger.info('No securities found in local storage, loading from MOEX...')
             loaded_count = await market_service.sync_securities_from_moex()
-            print(f'Loaded {loaded_count} securities from MOEX')
+            logger.info('Loaded %d securities from MOEX', loaded_count)
             securities = await market_service.get_securities()
         
         if not securities:
-            print('Failed to load securities data')
+            logger.error('Failed to load securities data')
             return
         
         security_codes = [sec.secid for sec in securities]
-        print(f'Processing {len(security_codes)} securities...')
+        logger.info('Processing %d securities...', len(security_codes))
         
-        historical_updated = 0
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=30)
         
-        for secid in security_codes:
+        # Ограничиваем число одновременных запросов к MOEX
+        semaphore = asyncio.Semaphore(settings.moex_max_connections)
+        
+        async def sync_security(secid: str) -> int:
+            # Ошибка по одной бумаге не должна отменять остальные задачи группы
             try:
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=30)
-                
-                history_count = await market_service.sync_quotes_for_security(
-                    secid=secid,
-                    from_date=start_date,
-                    to_date=end_date
-                )
-                historical_updated += history_count
-                print(f'Updated {history_count} historical quotes for {secid}')
-                
+                async with semaphore:
+                    history_count = await market_service.sync_quotes_for_security(
+                        secid=secid,
+                        from_date=start_date,
+                        to_date=end_date
+                    )
             except Exception as e:
-                print(f'Failed to update historical data for {secid}: {e}')
-                continue
+                logger.warning('Failed to update historical data for %s: %s', secid, e)
+                return 0
+            
+            logger.debug('Updated %d historical quotes for %s', history_count, secid)
+            return history_count
+        
+        tasks = []
+        try:
+            # Общий лимит времени, чтобы зависший запрос не растянул обновление до следующего запуска
+            async with asyncio.timeout(SYNC_TIMEOUT):
+                async with asyncio.TaskGroup() as tg:
+                    for secid in security_codes:
+                        tasks.append(tg.create_task(sync_security(secid)))
+        except TimeoutError:
+            unfinished = sum(1 for task in tasks if task.cancelled())
+            logger.error('Market data update timed out after %d s, %d securities not processed', SYNC_TIMEOUT, unfinished)
+        
+        historical_updated = sum(task.result() for task in tasks if not task.cancelled())
         
-        print(f'Market data update completed successfully:')
-        print(f'  - Historical quotes updated: {historical_updated}')
-        print(f'  - Securities processed: {len(security_codes)}')
+        logger.info(
+            'Market data update completed: %d historical quotes updated, %d securities processed',
+            historical_updated,
+            len(security_codes)
+        )
         
     except Exception as e:
-        print(f'Market data update failed: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Market data update failed: %s', e)
     
     finally:
         try:
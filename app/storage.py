@@ -1,8 +1,20 @@
-from typing import Dict, List, Optional
+import time
+from collections import defaultdict
+from contextvars import ContextVar, Token
+from itertools import count, islice
+from operator import attrgetter
+from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Sequence, Tuple
 from app.modules.marketdata.models import Security, Quote
 from app.modules.portfolio.models import Portfolio, Position
 
 
+# Shared read-only results for lookups that miss, so no empty container is allocated per call
+_NO_QUOTES: Tuple[Quote, ...] = ()
+_NO_POSITIONS: Tuple[Position, ...] = ()
+
+_quote_timestamp = attrgetter('timestamp')
+
+
 class DataManager:
     """
     Centralized data manager that encapsulates all application state.
@@ -10,18 +22,54 @@ class DataManager:
     for data operations.
     """
     
+    __slots__ = (
+        '_securities_store',
+        '_quotes_store',
+        '_latest_quotes',
+        '_portfolios_store',
+        '_positions_store',
+        '_positions_by_portfolio',
+        '_securities_list',
+        '_portfolios_list',
+        '_positions_list',
+        '_security_ids',
+        '_quote_ids',
+        '_portfolio_ids',
+        '_position_ids',
+        '_securities_version',
+        '_positions_versions',
+        '_summary_cache',
+    )
+    
     def __init__(self):
+        self._init_stores()
+        
+        # Securities list version for ETags; starts from the current time
+        # so values are not reused after a process restart
+        self._securities_version: int = time.time_ns()
+    
+    def _init_stores(self) -> None:
         # In-memory storage
         self._securities_store: Dict[str, Security] = {}
-        self._quotes_store: Dict[str, List[Quote]] = {}
+        self._quotes_store: DefaultDict[str, List[Quote]] = defaultdict(list)
+        self._latest_quotes: Dict[str, Quote] = {}
         self._portfolios_store: Dict[int, Portfolio] = {}
         self._positions_store: Dict[int, Position] = {}
         
+        # Secondary index: portfolio_id -> {position_id: Position}
+        self._positions_by_portfolio: Dict[int, Dict[int, Position]] = {}
+        
+        # Snapshots returned by get_all_*; reset on every write to the store
+        self._securities_list: Optional[List[Security]] = None
+        self._portfolios_list: Optional[List[Portfolio]] = None
+        self._positions_list: Optional[List[Position]] = None
+        
         # ID counters
-        self._next_security_id: int = 1
-        self._next_quote_id: int = 1
-        self._next_portfolio_id: int = 1
-        self._next_position_id: int = 1
+        self._reset_id_counters()
+        
+        # Per-portfolio positions versions and summaries computed for them
+        self._positions_versions: Dict[int, int] = {}
+        self._summary_cache: Dict[int, Tuple[int, Any]] = {}
     
     # Security operations
     def get_security(self, secid: str) -> Optional[Security]:
@@ -29,25 +77,63 @@ class DataManager:
     
     def add_security(self, security: Security) -> None:
         self._securities_store[security.secid] = security
+        self._securities_version += 1
+        self._securities_list = None
+    
+    def add_securities(self, securities: Iterable[Security]) -> int:
+        """Add a batch of securities in a single call, skipping already known secids.
+        
+        Returns the number of securities actually added.
+        """
+        store = self._securities_store
+        new = {security.secid: security for security in securities if security.secid not in store}
+        if new:
+            # update() from a dict grows the store once up front instead of per insert
+            store.update(new)
+            self._securities_version += 1
+            self._securities_list = None
+        return len(new)
     
     def get_all_securities(self) -> List[Security]:
-        return list(self._securities_store.values())
+        """Get all securities (shared snapshot - do not mutate)"""
+        if self._securities_list is None:
+            self._securities_list = list(self._securities_store.values())
+        return self._securities_list
+    
+    def get_securities(self, skip: int = 0, limit: int = 100) -> List[Security]:
+        """Get a page of securities without copying the whole store"""
+        return list(islice(self._securities_store.values(), skip, skip + limit))
     
     def security_exists(self, secid: str) -> bool:
         return secid in self._securities_store
     
+    def get_securities_version(self) -> int:
+        return self._securities_version
+    
     # Quote operations
-    def get_quotes(self, secid: str) -> List[Quote]:
-        return self._quotes_store.get(secid, [])
+    def get_quotes(self, secid: str) -> Sequence[Quote]:
+        return self._quotes_store.get(secid, _NO_QUOTES)
     
     def add_quote(self, quote: Quote) -> None:
-        if quote.secid not in self._quotes_store:
-            self._quotes_store[quote.secid] = []
         self._quotes_store[quote.secid].append(quote)
+        self._update_latest_quote(quote.secid, quote)
+    
+    def add_quotes(self, secid: str, quotes: List[Quote]) -> None:
+        """Add a batch of quotes for one security in a single call"""
+        if not quotes:
+            # Don't create an empty per-secid list - get_quotes keeps returning the shared sentinel
+            return
+        self._quotes_store[secid].extend(quotes)
+        self._update_latest_quote(secid, max(quotes, key=_quote_timestamp))
+    
+    def _update_latest_quote(self, secid: str, quote: Quote) -> None:
+        # History can arrive after the current price, so keep the newest by timestamp
+        current = self._latest_quotes.get(secid)
+        if current is None or quote.timestamp >= current.timestamp:
+            self._latest_quotes[secid] = quote
     
     def get_latest_quote(self, secid: str) -> Optional[Quote]:
-        quotes = self._quotes_store.get(secid, [])
-        return quotes[-1] if quotes else None
+        return self._latest_quotes.get(secid)
     
     # Portfolio operations
     def get_portfolio(self, portfolio_id: int) -> Optional[Portfolio]:
@@ -55,60 +141,105 @@ class DataManager:
     
     def add_portfolio(self, portfolio: Portfolio) -> None:
         self._portfolios_store[portfolio.id] = portfolio
+        self._portfolios_list = None
+        self.touch_positions(portfolio.id)
     
     def get_all_portfolios(self) -> List[Portfolio]:
-        return list(self._portfolios_store.values())
+        """Get all portfolios (shared snapshot - do not mutate)"""
+        if self._portfolios_list is None:
+            self._portfolios_list = list(self._portfolios_store.values())
+        return self._portfolios_list
+    
+    def get_portfolios(self, skip: int = 0, limit: int = 100) -> List[Portfolio]:
+        """Get a page of portfolios without copying the whole store"""
+        return list(islice(self._portfolios_store.values(), skip, skip + limit))
     
     def get_next_portfolio_id(self) -> int:
-        next_id = self._next_portfolio_id
-        self._next_portfolio_id += 1
-        return next_id
+        return next(self._portfolio_ids)
     
     # Position operations
     def get_position(self, position_id: int) -> Optional[Position]:
         return self._positions_store.get(position_id)
     
     def add_position(self, position: Position) -> None:
+        previous = self._positions_store.get(position.id)
+        if previous is not None and previous.portfolio_id != position.portfolio_id:
+            self._positions_by_portfolio[previous.portfolio_id].pop(position.id, None)
+            self.touch_positions(previous.portfolio_id)
+        
         self._positions_store[position.id] = position
+        self._positions_list = None
+        self._positions_by_portfolio.setdefault(position.portfolio_id, {})[position.id] = position
+        self.touch_positions(position.portfolio_id)
     
-    def get_positions_for_portfolio(self, portfolio_id: int) -> List[Position]:
-        return [pos for pos in self._positions_store.values() if pos.portfolio_id == portfolio_id]
+    def get_positions_for_portfolio(self, portfolio_id: int) -> Sequence[Position]:
+        positions = self._positions_by_portfolio.get(portfolio_id)
+        if not positions:
+            return _NO_POSITIONS
+        return list(positions.values())
     
     def get_all_positions(self) -> List[Position]:
-        return list(self._positions_store.values())
+        """Get all positions (shared snapshot - do not mutate)"""
+        if self._positions_list is None:
+            self._positions_list = list(self._positions_store.values())
+        return self._positions_list
     
     def get_next_position_id(self) -> int:
-        next_id = self._next_position_id
-        self._next_position_id += 1
-        return next_id
+        return next(self._position_ids)
+    
+    # Portfolio summary cache operations
+    def get_positions_version(self, portfolio_id: int) -> int:
+        return self._positions_versions.get(portfolio_id, 0)
+    
+    def touch_positions(self, portfolio_id: int) -> None:
+        """Mark portfolio positions as changed - invalidates the cached summary"""
+        self._positions_versions[portfolio_id] = self._positions_versions.get(portfolio_id, 0) + 1
+    
+    def get_cached_summary(self, portfolio_id: int, version: int) -> Optional[Any]:
+        cached = self._summary_cache.get(portfolio_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        return None
+    
+    def cache_summary(self, portfolio_id: int, version: int, summary: Any) -> None:
+        self._summary_cache[portfolio_id] = (version, summary)
     
     # ID counter operations
     def get_next_security_id(self) -> int:
-        next_id = self._next_security_id
-        self._next_security_id += 1
-        return next_id
+        return next(self._security_ids)
     
     def get_next_quote_id(self) -> int:
-        next_id = self._next_quote_id
-        self._next_quote_id += 1
-        return next_id
+        return next(self._quote_ids)
+    
+    def _reset_id_counters(self) -> None:
+        self._security_ids = count(1)
+        self._quote_ids = count(1)
+        self._portfolio_ids = count(1)
+        self._position_ids = count(1)
     
     def clear_all(self) -> None:
         """Clear all data - useful for testing"""
-        self._securities_store.clear()
-        self._quotes_store.clear()
-        self._portfolios_store.clear()
-        self._positions_store.clear()
-        self._next_security_id = 1
-        self._next_quote_id = 1
-        self._next_portfolio_id = 1
-        self._next_position_id = 1
+        # Rebind fresh containers through the same path as __init__, so a new store can't be missed here
+        self._init_stores()
+        self._securities_version += 1
 
 
 # Global instance - will be replaced with dependency injection
 # This is a temporary bridge during refactoring
 _data_manager = DataManager()
 
+# Every context sees the shared instance unless it installs its own; the store
+# must outlive a single request, so a fresh manager is only for isolated tasks and tests
+_data_manager_var: ContextVar[DataManager] = ContextVar('data_manager', default=_data_manager)
+
 def get_data_manager() -> DataManager:
     """Factory function to get the data manager instance"""
-    return _data_manager
+    return _data_manager_var.get()
+
+def use_data_manager(data_manager: DataManager) -> Token:
+    """Make data_manager current for this context; pass the token to reset_data_manager"""
+    return _data_manager_var.set(data_manager)
+
+def reset_data_manager(token: Token) -> None:
+    """Restore the data manager that was current before use_data_manager"""
+    _data_manager_var.reset(token)
@@ -2,6 +2,9 @@ import pytest
 import asyncio
 from typing import Generator
 
+from fastapi.testclient import TestClient
+
+from app.main import app
 from app.storage import DataManager
 
 
@@ -13,6 +16,15 @@ def event_loop() -> Generator:
     loop.close()
 
 
+@pytest.fixture(scope='session')
+def client():
+    ''"One TestClient (and one app lifespan) for the whole test session''"
+    with TestClient(app) as client:
+        # Схема OpenAPI строится один раз и кешируется в app
+        app.openapi()
+        yield client
+
+
 @pytest.fixture
 def data_manager():
     ''"Create a fresh DataManager instance for each test.''"
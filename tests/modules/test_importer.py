@@ -0,0 +1,66 @@
+import pytest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.modules.importer.api import router
+from app.modules.importer.service import BrokerStatementParser
+
+
+class TestBrokerStatementParser:
+    
+    @pytest.fixture
+    def parser(self):
+        return BrokerStatementParser()
+    
+    def test_numeric_cells_parsed_as_text(self, parser):
+        # calamine отдает числовые ячейки как float
+        row = [12345.0, 'Акция обыкновенная', 10301481.0, 'RU0009029540', None, 100.0]
+        position = parser._create_position_from_row(row)
+        
+        assert position.issuer == '12345'
+        assert position.trading_code == '10301481'
+        assert position.quantity == 100
+    
+    def test_text_cells_unchanged(self, parser):
+        row = ['ПАО Сбербанк', 'Акция обыкновенная', '10301481B', 'RU0009029540', 'RUB', '1 000']
+        position = parser._create_position_from_row(row)
+        
+        assert position.issuer == 'ПАО Сбербанк'
+        assert position.trading_code == '10301481B'
+        assert position.currency == 'RUB'
+        assert position.quantity == 1000
+
+
+class TestUploadLimit:
+    
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(router)
+        with patch.object(settings, 'max_upload_size', 1000):
+            yield TestClient(app)
+    
+    def test_rejects_large_content_length(self, client):
+        response = client.post('/import/broker-statement/validate', files={'file': ('statement.xlsx', b'x' * 5000)})
+        assert response.status_code == 413
+    
+    def test_rejects_large_chunked_body(self, client):
+        def body():
+            yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="statement.xlsx"\r\n\r\n'
+            for _ in range(10):
+                yield b'x' * 500
+            yield b'\r\n--b--\r\n'
+        
+        response = client.post(
+            '/import/broker-statement/validate',
+            content=body(),
+            headers={'content-type': 'multipart/form-data; boundary=b'}
+        )
+        assert response.status_code == 413
+    
+    def test_small_upload_reaches_checks(self, client):
+        response = client.post('/import/broker-statement/validate', files={'file': ('statement.xlsx', b'x' * 10)})
+        assert response.status_code == 415
@@ -82,3 +82,12 @@ class TestQuoteSchemas:
         assert quote.price == Decimal('180.25')
         assert isinstance(quote.timestamp, datetime)
 
+    
+    def test_quote_decimal_serialization(self):
+        quote = QuoteBase(
+            secid='SBER',
+            timestamp=datetime(2024, 1, 15, 10, 0),
+            close_price=Decimal('250.10')
+        )
+        assert quote.model_dump()['close_price'] == Decimal('250.10')
+        assert quote.model_dump(mode='json')['close_price'] == 250.1
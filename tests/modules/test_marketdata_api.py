@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+
+from app.main import app
+from app.modules.marketdata.models import Quote
+from app.storage import get_data_manager
+
+
+@pytest.fixture(autouse=True)
+def override_data_manager(data_manager):
+    app.dependency_overrides[get_data_manager] = lambda: data_manager
+    yield
+    app.dependency_overrides.pop(get_data_manager, None)
+
+
+class TestQuotesApi:
+    
+    def test_quotes_history_returns_float_prices(self, client, data_manager):
+        data_manager.add_quote(Quote(
+            secid='SBER',
+            timestamp=datetime(2024, 1, 15, 10, 0),
+            price=Decimal('250.10'),
+            volume=Decimal('1000')
+        ))
+        
+        response = client.get('/api/v1/marketdata/quotes/SBER/history')
+        
+        assert response.status_code == 200
+        quotes = response.json()
+        assert len(quotes) == 1
+        assert quotes[0]['secid'] == 'SBER'
+        assert quotes[0]['price'] == 250.1
+        assert quotes[0]['volume'] == 1000.0
+        assert quotes[0]['bid'] is None
+    
+    def test_latest_quote(self, client, data_manager):
+        data_manager.add_quote(Quote(secid='SBER', timestamp=datetime(2024, 1, 15, 10, 0), price=Decimal('250.10')))
+        
+        response = client.get('/api/v1/marketdata/quotes/SBER/latest')
+        
+        assert response.status_code == 200
+        assert response.json()['price'] == 250.1
+
+
+class TestSecuritiesEtag:
+    
+    def test_not_modified_for_matching_etag(self, client):
+        response = client.get('/api/v1/marketdata/securities')
+        assert response.status_code == 200
+        etag = response.headers['etag']
+        
+        response = client.get('/api/v1/marketdata/securities', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    
+    def test_not_modified_for_tag_list(self, client):
+        etag = client.get('/api/v1/marketdata/securities').headers['etag']
+        
+        response = client.get('/api/v1/marketdata/securities', headers={'If-None-Match': f'W/"stale", {etag}'})
+        assert response.status_code == 304
+        
+        response = client.get('/api/v1/marketdata/securities', headers={'If-None-Match': '*'})
+        assert response.status_code == 304
+        
+        response = client.get('/api/v1/marketdata/securities', headers={'If-None-Match': 'W/"stale", W/"other"'})
+        assert response.status_code == 200
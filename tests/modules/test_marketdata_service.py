@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch
 from datetime import datetime
@@ -184,6 +185,36 @@ class TestMarketDataServiceIntegration:
             assert len(securities) == 1
             assert securities[0].secid == 'GAZP'
     
+    @pytest.mark.asyncio
+    async def test_get_current_quotes_bounded_concurrency(self, marketdata_service):
+        ''"Test that current quotes are requested from the primary board with limited concurrency''"
+        active = 0
+        max_active = 0
+        urls = []
+        
+        class FakeISSClient:
+            def __init__(self, session, url, query):
+                self.url = url
+                urls.append(url)
+            
+            async def get(self):
+                nonlocal active, max_active
+                active += 1
+                max_active = max(max_active, active)
+                await asyncio.sleep(0)
+                active -= 1
+                secid = self.url.rsplit('/', 1)[-1].removesuffix('.json')
+                return {'marketdata': [{'SECID': secid, 'LAST': 100.5}]}
+        
+        secids = [f'SEC{i}' for i in range(10)]
+        with patch('app.modules.marketdata.service.aiomoex.ISSClient', FakeISSClient), \
+                patch('app.modules.marketdata.service.settings.moex_max_connections', 2):
+            quotes = await marketdata_service.get_current_quotes(secids)
+        
+        assert [quote['secid'] for quote in quotes] == secids
+        assert max_active <= 2
+        assert all('/boards/TQBR/securities/' in url for url in urls)
+    
     @pytest.mark.asyncio
     async def test_service_cleanup(self, marketdata_service):
         ''"Test that service properly closes its resources''"
@@ -178,6 +178,27 @@ class TestPortfolioServiceIntegration:
         assert updated_position.market_price == market_price
         assert updated_position.market_value == Decimal('25000.00')  # 100 * 250
     
+    @pytest.mark.asyncio
+    async def test_update_positions_market_data(self, portfolio_service):
+        ''"Test bulk update of market data for all portfolio positions''"
+        portfolio = await portfolio_service.create_portfolio(PortfolioCreate(name='Test Portfolio'))
+        
+        for secid, quantity in [('SBER', 100), ('GAZP', 10), ('LKOH', 1)]:
+            await portfolio_service.create_position(PositionCreate(
+                portfolio_id=portfolio.id,
+                secid=secid,
+                quantity=quantity
+            ))
+        
+        updated = await portfolio_service.update_positions_market_data(
+            portfolio.id, {'SBER': Decimal('250.00'), 'GAZP': Decimal('180.00')}
+        )
+        
+        assert len(updated) == 2
+        values = {pos.secid: pos.market_value for pos in updated}
+        assert values['SBER'] == Decimal('25000.00')
+        assert values['GAZP'] == Decimal('1800.00')
+    
     @pytest.mark.asyncio
     async def test_get_portfolio_summary(self, portfolio_service):
         ''"Test getting portfolio summary''"
@@ -198,6 +219,34 @@ class TestPortfolioServiceIntegration:
         assert summary.positions_count == 1
         assert len(summary.positions) == 1
         assert summary.positions[0].secid == 'SBER'
+    
+    @pytest.mark.asyncio
+    async def test_portfolio_summary_cache_invalidation(self, portfolio_service):
+        ''"Test that cached summary is refreshed after position changes''"
+        portfolio = await portfolio_service.create_portfolio(PortfolioCreate(name='Test Portfolio'))
+        
+        position = await portfolio_service.create_position(PositionCreate(
+            portfolio_id=portfolio.id,
+            secid='SBER',
+            quantity=100
+        ))
+        
+        summary = await portfolio_service.get_portfolio_summary(portfolio.id)
+        assert await portfolio_service.get_portfolio_summary(portfolio.id) is summary
+        
+        # Market data update invalidates the summary
+        await portfolio_service.update_position_market_data(position.id, Decimal('250.00'))
+        updated = await portfolio_service.get_portfolio_summary(portfolio.id)
+        assert updated is not summary
+        assert updated.positions[0].market_price == Decimal('250.00')
+        
+        # New position invalidates the summary
+        await portfolio_service.create_position(PositionCreate(
+            portfolio_id=portfolio.id,
+            secid='GAZP',
+            quantity=10
+        ))
+        assert (await portfolio_service.get_portfolio_summary(portfolio.id)).positions_count == 2
 
 
 class TestDataManagerIsolation:
@@ -1,4 +1,6 @@
-from app.storage import DataManager
+import asyncio
+
+from app.storage import DataManager, get_data_manager, reset_data_manager, use_data_manager
 from app.modules.portfolio.models import Portfolio, Position
 from app.modules.marketdata.models import Security, Quote
 from decimal import Decimal
@@ -8,49 +10,43 @@ from datetime import datetime
 class TestDataManager:
     ''"Test DataManager functionality''"
     
-    def test_data_manager_initialization(self):
+    def test_data_manager_initialization(self, data_manager):
         ''"Test that DataManager initializes correctly''"
-        dm = DataManager()
-        
         # Check initial state
-        assert len(dm.get_all_portfolios()) == 0
-        assert len(dm.get_all_positions()) == 0
-        assert len(dm.get_all_securities()) == 0
+        assert len(data_manager.get_all_portfolios()) == 0
+        assert len(data_manager.get_all_positions()) == 0
+        assert len(data_manager.get_all_securities()) == 0
         
         # Check initial ID counters
-        assert dm.get_next_portfolio_id() == 1
-        assert dm.get_next_position_id() == 1
-        assert dm.get_next_security_id() == 1
-        assert dm.get_next_quote_id() == 1
+        assert data_manager.get_next_portfolio_id() == 1
+        assert data_manager.get_next_position_id() == 1
+        assert data_manager.get_next_security_id() == 1
+        assert data_manager.get_next_quote_id() == 1
     
-    def test_portfolio_operations(self):
+    def test_portfolio_operations(self, data_manager):
         ''"Test portfolio CRUD operations''"
-        dm = DataManager()
-        
         # Create portfolio
         portfolio = Portfolio(id=1, name='Test Portfolio', description='Test Description')
-        dm.add_portfolio(portfolio)
+        data_manager.add_portfolio(portfolio)
         
         # Retrieve portfolio
-        retrieved = dm.get_portfolio(1)
+        retrieved = data_manager.get_portfolio(1)
         assert retrieved is not None
         assert retrieved.id == 1
         assert retrieved.name == 'Test Portfolio'
         assert retrieved.description == 'Test Description'
         
         # Get all portfolios
-        all_portfolios = dm.get_all_portfolios()
+        all_portfolios = data_manager.get_all_portfolios()
         assert len(all_portfolios) == 1
         assert all_portfolios[0].id == 1
         
         # Get non-existent portfolio
-        non_existent = dm.get_portfolio(999)
+        non_existent = data_manager.get_portfolio(999)
         assert non_existent is None
     
-    def test_position_operations(self):
+    def test_position_operations(self, data_manager):
         ''"Test position CRUD operations''"
-        dm = DataManager()
-        
         # Create position
         position = Position(
             id=1,
@@ -59,10 +55,10 @@ class TestDataManager:
             quantity=100,
             target_weight=Decimal('0.25')
         )
-        dm.add_position(position)
+        data_manager.add_position(position)
         
         # Retrieve position
-        retrieved = dm.get_position(1)
+        retrieved = data_manager.get_position(1)
         assert retrieved is not None
         assert retrieved.id == 1
         assert retrieved.portfolio_id == 1
@@ -70,51 +66,116 @@ class TestDataManager:
         assert retrieved.quantity == 100
         
         # Get all positions
-        all_positions = dm.get_all_positions()
+        all_positions = data_manager.get_all_positions()
         assert len(all_positions) == 1
         assert all_positions[0].id == 1
         
         # Get positions for portfolio
-        portfolio_positions = dm.get_positions_for_portfolio(1)
+        portfolio_positions = data_manager.get_positions_for_portfolio(1)
         assert len(portfolio_positions) == 1
         assert portfolio_positions[0].portfolio_id == 1
         
         # Get positions for non-existent portfolio
-        empty_positions = dm.get_positions_for_portfolio(999)
+        empty_positions = data_manager.get_positions_for_portfolio(999)
         assert len(empty_positions) == 0
     
-    def test_security_operations(self):
+    def test_security_operations(self, data_manager):
         ''"Test security CRUD operations''"
-        dm = DataManager()
-        
         # Create security
         security = Security(secid='SBER', name='Сбербанк', isin='RU0009029540')
-        dm.add_security(security)
+        data_manager.add_security(security)
         
         # Retrieve security
-        retrieved = dm.get_security('SBER')
+        retrieved = data_manager.get_security('SBER')
         assert retrieved is not None
         assert retrieved.secid == 'SBER'
         assert retrieved.name == 'Сбербанк'
         assert retrieved.isin == 'RU0009029540'
         
         # Check security exists
-        assert dm.security_exists('SBER') is True
-        assert dm.security_exists('NONEXISTENT') is False
+        assert data_manager.security_exists('SBER') is True
+        assert data_manager.security_exists('NONEXISTENT') is False
         
         # Get all securities
-        all_securities = dm.get_all_securities()
+        all_securities = data_manager.get_all_securities()
         assert len(all_securities) == 1
         assert all_securities[0].secid == 'SBER'
         
         # Get non-existent security
-        non_existent = dm.get_security('NONEXISTENT')
+        non_existent = data_manager.get_security('NONEXISTENT')
         assert non_existent is None
     
-    def test_quote_operations(self):
+    def test_securities_version(self, data_manager):
+        ''"Test that securities version changes on every write''"
+        initial = data_manager.get_securities_version()
+        data_manager.add_security(Security(secid='SBER', name='Сбербанк'))
+        after_add = data_manager.get_securities_version()
+        assert after_add != initial
+        
+        # Чтение не меняет версию
+        data_manager.get_all_securities()
+        assert data_manager.get_securities_version() == after_add
+        
+        data_manager.clear_all()
+        assert data_manager.get_securities_version() not in (initial, after_add)
+    
+    def test_add_securities_bulk(self, data_manager):
+        ''"Test bulk securities insert skips known secids''"
+        data_manager.add_security(Security(secid='SBER', name='Сбербанк'))
+        version = data_manager.get_securities_version()
+        
+        added = data_manager.add_securities([
+            Security(secid='SBER', name='Другое имя'),
+            Security(secid='GAZP', name='Газпром'),
+        ])
+        assert added == 1
+        assert data_manager.get_security('SBER').name == 'Сбербанк'
+        assert data_manager.get_security('GAZP') is not None
+        assert data_manager.get_securities_version() != version
+        
+        # Повторная вставка ничего не меняет
+        version = data_manager.get_securities_version()
+        assert data_manager.add_securities([Security(secid='GAZP', name='Газпром')]) == 0
+        assert data_manager.get_securities_version() == version
+    
+    def test_latest_quote_by_timestamp(self, data_manager):
+        ''"Test that older quotes added later do not replace the latest one''"
+        data_manager.add_quote(Quote(secid='SBER', timestamp=datetime(2024, 1, 10), price=Decimal('260.00')))
+        data_manager.add_quotes('SBER', [
+            Quote(secid='SBER', timestamp=datetime(2024, 1, 9), price=Decimal('255.00')),
+            Quote(secid='SBER', timestamp=datetime(2024, 1, 8), price=Decimal('250.00')),
+        ])
+        assert data_manager.get_latest_quote('SBER').price == Decimal('260.00')
+        assert len(data_manager.get_quotes('SBER')) == 3
+        
+        data_manager.add_quotes('SBER', [
+            Quote(secid='SBER', timestamp=datetime(2024, 1, 12), price=Decimal('270.00')),
+            Quote(secid='SBER', timestamp=datetime(2024, 1, 11), price=Decimal('265.00')),
+        ])
+        assert data_manager.get_latest_quote('SBER').price == Decimal('270.00')
+    
+    def test_get_all_snapshot_invalidation(self, data_manager):
+        ''"Test that get_all_* snapshots are reused until the next write''"
+        data_manager.add_security(Security(secid='SBER', name='Сбербанк'))
+        snapshot = data_manager.get_all_securities()
+        assert data_manager.get_all_securities() is snapshot
+        
+        data_manager.add_security(Security(secid='GAZP', name='Газпром'))
+        assert len(data_manager.get_all_securities()) == 2
+        assert len(snapshot) == 1
+    
+    def test_pagination(self, data_manager):
+        ''"Test paginated access to securities and portfolios''"
+        for i in range(5):
+            data_manager.add_security(Security(secid=f'SEC{i}', name=f'Security {i}'))
+            data_manager.add_portfolio(Portfolio(id=i + 1, name=f'Portfolio {i}'))
+        
+        assert [sec.secid for sec in data_manager.get_securities(skip=1, limit=2)] == ['SEC1', 'SEC2']
+        assert [p.id for p in data_manager.get_portfolios(skip=3, limit=10)] == [4, 5]
+        assert data_manager.get_securities(skip=10) == []
+    
+    def test_quote_operations(self, data_manager):
         ''"Test quote CRUD operations''"
-        dm = DataManager()
-        
         # Create quote
         quote = Quote(
             secid='SBER',
@@ -122,16 +183,16 @@ class TestDataManager:
             price=Decimal('250.00'),
             volume=Decimal('1000')
         )
-        dm.add_quote(quote)
+        data_manager.add_quote(quote)
         
         # Get quotes for security
-        quotes = dm.get_quotes('SBER')
+        quotes = data_manager.get_quotes('SBER')
         assert len(quotes) == 1
         assert quotes[0].secid == 'SBER'
         assert quotes[0].price == Decimal('250.00')
         
         # Get latest quote
-        latest = dm.get_latest_quote('SBER')
+        latest = data_manager.get_latest_quote('SBER')
         assert latest is not None
         assert latest.secid == 'SBER'
         assert latest.price == Decimal('250.00')
@@ -143,47 +204,67 @@ class TestDataManager:
             price=Decimal('260.00'),
             volume=Decimal('1500')
         )
-        dm.add_quote(quote2)
+        data_manager.add_quote(quote2)
         
         # Check that latest quote is updated
-        quotes = dm.get_quotes('SBER')
+        quotes = data_manager.get_quotes('SBER')
         assert len(quotes) == 2
         
-        latest = dm.get_latest_quote('SBER')
+        latest = data_manager.get_latest_quote('SBER')
         assert latest.price == Decimal('260.00')
         
         # Get quotes for non-existent security
-        empty_quotes = dm.get_quotes('NONEXISTENT')
+        empty_quotes = data_manager.get_quotes('NONEXISTENT')
         assert len(empty_quotes) == 0
         
-        no_quote = dm.get_latest_quote('NONEXISTENT')
+        no_quote = data_manager.get_latest_quote('NONEXISTENT')
         assert no_quote is None
     
-    def test_id_counters(self):
-        ''"Test ID counter functionality''"
-        dm = DataManager()
+    def test_add_quotes_bulk(self, data_manager):
+        ''"Test adding a batch of quotes at once''"
+        data_manager.add_quote(Quote(secid='SBER', timestamp=datetime.now(), price=Decimal('250.00')))
+        data_manager.add_quotes('SBER', [
+            Quote(secid='SBER', timestamp=datetime.now(), price=Decimal('255.00')),
+            Quote(secid='SBER', timestamp=datetime.now(), price=Decimal('260.00'))
+        ])
+        
+        quotes = data_manager.get_quotes('SBER')
+        assert len(quotes) == 3
+        assert data_manager.get_latest_quote('SBER').price == Decimal('260.00')
+        
+        # Empty batch does not break anything
+        data_manager.add_quotes('GAZP', [])
+        assert len(data_manager.get_quotes('GAZP')) == 0
+    
+    def test_add_quotes_empty_batch(self, data_manager):
+        ''"Test that an empty batch stores nothing for an unknown security''"
+        data_manager.add_quotes('GAZP', [])
         
+        assert data_manager.get_quotes('GAZP') is data_manager.get_quotes('NONEXISTENT')
+        assert 'GAZP' not in data_manager._quotes_store
+        assert data_manager.get_latest_quote('GAZP') is None
+    
+    def test_id_counters(self, data_manager):
+        ''"Test ID counter functionality''"
         # Test portfolio ID counter
-        assert dm.get_next_portfolio_id() == 1
-        assert dm.get_next_portfolio_id() == 2
-        assert dm.get_next_portfolio_id() == 3
+        assert data_manager.get_next_portfolio_id() == 1
+        assert data_manager.get_next_portfolio_id() == 2
+        assert data_manager.get_next_portfolio_id() == 3
         
         # Test position ID counter
-        assert dm.get_next_position_id() == 1
-        assert dm.get_next_position_id() == 2
+        assert data_manager.get_next_position_id() == 1
+        assert data_manager.get_next_position_id() == 2
         
         # Test security ID counter
-        assert dm.get_next_security_id() == 1
-        assert dm.get_next_security_id() == 2
+        assert data_manager.get_next_security_id() == 1
+        assert data_manager.get_next_security_id() == 2
         
         # Test quote ID counter
-        assert dm.get_next_quote_id() == 1
-        assert dm.get_next_quote_id() == 2
+        assert data_manager.get_next_quote_id() == 1
+        assert data_manager.get_next_quote_id() == 2
     
-    def test_clear_all(self):
+    def test_clear_all(self, data_manager):
         ''"Test clearing all data''"
-        dm = DataManager()
-        
         # Add some data
         portfolio = Portfolio(id=1, name='Test Portfolio')
         position = Position(id=1, portfolio_id=1, secid='SBER', quantity=100)
@@ -195,58 +276,56 @@ class TestDataManager:
             volume=Decimal('1000')
         )
         
-        dm.add_portfolio(portfolio)
-        dm.add_position(position)
-        dm.add_security(security)
-        dm.add_quote(quote)
+        data_manager.add_portfolio(portfolio)
+        data_manager.add_position(position)
+        data_manager.add_security(security)
+        data_manager.add_quote(quote)
         
         # Advance ID counters
-        dm.get_next_portfolio_id()
-        dm.get_next_position_id()
+        data_manager.get_next_portfolio_id()
+        data_manager.get_next_position_id()
         
         # Verify data exists
-        assert len(dm.get_all_portfolios()) == 1
-        assert len(dm.get_all_positions()) == 1
-        assert len(dm.get_all_securities()) == 1
-        assert len(dm.get_quotes('SBER')) == 1
+        assert len(data_manager.get_all_portfolios()) == 1
+        assert len(data_manager.get_all_positions()) == 1
+        assert len(data_manager.get_all_securities()) == 1
+        assert len(data_manager.get_quotes('SBER')) == 1
         
         # Clear all
-        dm.clear_all()
+        data_manager.clear_all()
         
         # Verify everything is cleared
-        assert len(dm.get_all_portfolios()) == 0
-        assert len(dm.get_all_positions()) == 0
-        assert len(dm.get_all_securities()) == 0
-        assert len(dm.get_quotes('SBER')) == 0
+        assert len(data_manager.get_all_portfolios()) == 0
+        assert len(data_manager.get_all_positions()) == 0
+        assert len(data_manager.get_all_securities()) == 0
+        assert len(data_manager.get_quotes('SBER')) == 0
         
         # Verify ID counters are reset
-        assert dm.get_next_portfolio_id() == 1
-        assert dm.get_next_position_id() == 1
-        assert dm.get_next_security_id() == 1
-        assert dm.get_next_quote_id() == 1
+        assert data_manager.get_next_portfolio_id() == 1
+        assert data_manager.get_next_position_id() == 1
+        assert data_manager.get_next_security_id() == 1
+        assert data_manager.get_next_quote_id() == 1
     
-    def test_multiple_portfolios_and_positions(self):
+    def test_multiple_portfolios_and_positions(self, data_manager):
         ''"Test complex scenario with multiple portfolios and positions''"
-        dm = DataManager()
-        
         # Create portfolios
         portfolio1 = Portfolio(id=1, name='Portfolio 1')
         portfolio2 = Portfolio(id=2, name='Portfolio 2')
-        dm.add_portfolio(portfolio1)
-        dm.add_portfolio(portfolio2)
+        data_manager.add_portfolio(portfolio1)
+        data_manager.add_portfolio(portfolio2)
         
         # Create positions for different portfolios
         pos1 = Position(id=1, portfolio_id=1, secid='SBER', quantity=100)
         pos2 = Position(id=2, portfolio_id=1, secid='GAZP', quantity=50)
         pos3 = Position(id=3, portfolio_id=2, secid='SBER', quantity=200)
         
-        dm.add_position(pos1)
-        dm.add_position(pos2)
-        dm.add_position(pos3)
+        data_manager.add_position(pos1)
+        data_manager.add_position(pos2)
+        data_manager.add_position(pos3)
         
         # Test portfolio-specific position retrieval
-        portfolio1_positions = dm.get_positions_for_portfolio(1)
-        portfolio2_positions = dm.get_positions_for_portfolio(2)
+        portfolio1_positions = data_manager.get_positions_for_portfolio(1)
+        portfolio2_positions = data_manager.get_positions_for_portfolio(2)
         
         assert len(portfolio1_positions) == 2
         assert len(portfolio2_positions) == 1
@@ -258,3 +337,27 @@ class TestDataManager:
         
         assert portfolio2_positions[0].secid == 'SBER'
         assert portfolio2_positions[0].quantity == 200
+        
+        # Re-adding a position under another portfolio moves it
+        data_manager.add_position(Position(id=2, portfolio_id=2, secid='GAZP', quantity=50))
+        assert len(data_manager.get_positions_for_portfolio(1)) == 1
+        assert len(data_manager.get_positions_for_portfolio(2)) == 2
+    
+    def test_context_scoped_data_manager(self):
+        ''"Test that a context-local DataManager does not leak into other contexts''"
+        shared = get_data_manager()
+        
+        async def isolated():
+            dm = DataManager()
+            use_data_manager(dm)
+            await asyncio.sleep(0)
+            return get_data_manager() is dm
+        
+        # Задача работает в копии контекста, поэтому её менеджер снаружи не виден
+        assert asyncio.run(isolated()) is True
+        assert get_data_manager() is shared
+        
+        token = use_data_manager(DataManager())
+        assert get_data_manager() is not shared
+        reset_data_manager(token)
+        assert get_data_manager() is shared
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
-''"
+"""
 Тесты для утилит конвертации XLS в CSV.
-''"
+"""
 
 import pytest
 import os
@@ -18,12 +18,19 @@ from utils.xls_to_csv import convert_xls_to_csv, analyze_xls_structure
 from utils.merge_csv_tables import merge_csv_tables, find_table_sections
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def test_data_path():
     ''"Путь к тестовым данным.''"
     return project_root / 'statement_sign.xls'
 
 
+@pytest.fixture(scope='session')
+def csv_file(test_data_path, tmp_path_factory):
+    ''"Конвертирует XLS в CSV один раз на весь прогон тестов.''"
+    output_file = tmp_path_factory.mktemp('statement') / 'statement_sign.csv'
+    return convert_xls_to_csv(str(test_data_path), str(output_file))
+
+
 @pytest.fixture
 def temp_output_file():
     ''"Создает временный файл для тестов.''"
@@ -91,17 +98,46 @@ class TestXlsToCsv:
         assert 'АНАЛИЗ СТРУКТУРЫ ФАЙЛА' in captured.out
         assert 'строк x' in captured.out
         assert 'колонок' in captured.out
+    
+    @pytest.mark.parametrize('engine', ['calamine', 'openpyxl'])
+    def test_streamed_csv_matches_pandas_with_blank_first_column(self, engine, tmp_path):
+        ''"Построчная запись CSV сохраняет пустую колонку A, как и pandas.''"
+        if engine == 'calamine':
+            pytest.importorskip('python_calamine')
+        openpyxl = pytest.importorskip('openpyxl')
+        
+        xlsx_file = tmp_path / 'blank_first_column.xlsx'
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = 'Account_Statement_auto_EXC'
+        sheet['B1'] = 'Title'
+        sheet.append([None, 'Эмитент', 'ISIN', 'Остаток (шт.)'])
+        sheet.append([None, 'ПАО Сбербанк', 'RU0009029540', 100])
+        workbook.save(xlsx_file)
+        
+        output_file = convert_xls_to_csv(str(xlsx_file), str(tmp_path / 'streamed.csv'), engine=engine, verbose=False)
+        expected = pd.read_excel(xlsx_file, sheet_name='Account_Statement_auto_EXC', engine=engine)
+        
+        with open(output_file, encoding='utf-8-sig') as fh:
+            assert fh.read() == expected.to_csv(index=False, lineterminator='\n')
+    
+    def test_corrupt_input_keeps_existing_output(self, tmp_path):
+        ''"Ошибка чтения книги не затирает уже существующий CSV.''"
+        bad_file = tmp_path / 'bad.xlsx'
+        bad_file.write_text('garbage')
+        output_file = tmp_path / 'out.csv'
+        output_file.write_text('old content')
+        
+        with pytest.raises(ValueError):
+            convert_xls_to_csv(str(bad_file), str(output_file), verbose=False)
+        
+        assert output_file.read_text() == 'old content'
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['bad.xlsx', 'out.csv']
 
 
 class TestMergeCsvTables:
     ''"Тесты для объединения CSV таблиц.''"
     
-    @pytest.fixture
-    def csv_file(self, test_data_path, temp_output_file):
-        ''"Создает CSV файл для тестирования.''"
-        convert_xls_to_csv(str(test_data_path), temp_output_file)
-        return temp_output_file
-    
     def test_merge_csv_tables_basic(self, csv_file):
         ''"Тест базового объединения CSV таблиц.''"
         output_file = merge_csv_tables(csv_file)
@@ -185,9 +221,8 @@ class TestIntegration:
             if os.path.exists(file_path):
                 os.unlink(file_path)
     
-    def test_file_sizes_reasonable(self, test_data_path):
+    def test_file_sizes_reasonable(self, test_data_path, csv_file):
         ''"Проверяем что размеры файлов разумные.''"
-        csv_file = convert_xls_to_csv(str(test_data_path))
         merged_file = merge_csv_tables(csv_file)
         
         xls_size = os.path.getsize(test_data_path)
@@ -201,10 +236,9 @@ class TestIntegration:
         assert merged_size > 0, 'Объединенный файл не должен быть пустым'
         assert merged_size < csv_size * 2, 'Объединенный файл не должен быть слишком большим'
         
-        # Cleanup
-        for file_path in [csv_file, merged_file]:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
+        # Cleanup: общий CSV удаляется вместе с каталогом tmp_path_factory
+        if os.path.exists(merged_file):
+            os.unlink(merged_file)
 
 
 if __name__ == '__main__':
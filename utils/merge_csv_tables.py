@@ -1,10 +1,50 @@
 #!/usr/bin/env python3
 
+import numpy as np
 import pandas as pd
 import argparse
+import re
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+
+
+# Строки, которые закрывают секцию или не могут быть её названием
+_SECTION_END_RE = re.compile("Итого по (?:разделу|счету)")
+_NOT_SECTION_NAME = ("Эмитент", "Итого")
+_NOT_DATA_ROW = ("Итого", "Дата составления")
+
+
+def _first_column(df: pd.DataFrame) -> np.ndarray:
+    """Первая колонка как массив строк, пустые ячейки - пустые строки."""
+    
+    first = df.iloc[:, 0]
+    return first.astype(str).mask(first.isna(), "").to_numpy(dtype=object)
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    return value
+
+
+def _section_name(col0: np.ndarray, header_row: int) -> str:
+    """Название секции по строкам над заголовком таблицы."""
+    
+    if header_row == 0:
+        return "Unknown"
+    
+    prev_cell = col0[header_row - 1]
+    if prev_cell.strip():
+        return _unquote(prev_cell)
+    
+    # Если в предыдущей строке пусто, ищем дальше
+    for prev_cell in col0[max(0, header_row - 3):header_row]:
+        if prev_cell.strip() and not prev_cell.startswith(_NOT_SECTION_NAME):
+            return _unquote(prev_cell)
+    
+    return "Unknown"
 
 
 def find_table_sections(df: pd.DataFrame) -> List[Tuple[str, int, int]]:
@@ -15,61 +55,38 @@ def find_table_sections(df: pd.DataFrame) -> List[Tuple[str, int, int]]:
     current_section = None
     current_start = None
     
-    for i, row in df.iterrows():
-        cell_value = str(row.iloc[0]) if pd.notna(row.iloc[0]) else ""
-        
-        if cell_value == header_pattern:
+    # Вместо обхода всех строк ищем заголовки и итоги масками по первой колонке,
+    # а в цикле проходим только по найденным строкам
+    col0 = _first_column(df)
+    is_header = col0 == header_pattern
+    first = pd.Series(col0, dtype=object)
+    is_footer = first.str.contains(_SECTION_END_RE).to_numpy(dtype=bool) & ~is_header
+    
+    for i in np.flatnonzero(is_header | is_footer).tolist():
+        if is_header[i]:
             if current_section is not None and current_start is not None:
                 sections.append((current_section, current_start, i-1))
             
-            section_name = "Unknown"
-            
-            if i > 0:
-                prev_cell = str(df.iloc[i-1, 0]) if pd.notna(df.iloc[i-1, 0]) else ""
-                if prev_cell and len(prev_cell.strip()) > 0:
-                    section_name = prev_cell.strip()
-                    if section_name.startswith('"') and section_name.endswith('"'):
-                        section_name = section_name[1:-1]
-                else:
-                    # Если в предыдущей строке пусто, ищем дальше
-                    for j in range(max(0, i-3), i):
-                        prev_cell = str(df.iloc[j, 0]) if pd.notna(df.iloc[j, 0]) else ""
-                        if (prev_cell and 
-                            not prev_cell.startswith("Эмитент") and 
-                            not prev_cell.startswith("Итого") and
-                            len(prev_cell.strip()) > 0 and
-                            prev_cell.strip() != ""):
-                            section_name = prev_cell.strip()
-                            if section_name.startswith('"') and section_name.endswith('"'):
-                                section_name = section_name[1:-1]
-                            break
-            
-            current_section = section_name
+            current_section = _section_name(col0, i)
             current_start = i + 1
             
-        elif "Итого по разделу" in cell_value or "Итого по счету" in cell_value:
-            if current_section is not None and current_start is not None:
-                sections.append((current_section, current_start, i-1))
-                current_section = None
-                current_start = None
+        elif current_section is not None and current_start is not None:
+            sections.append((current_section, current_start, i-1))
+            current_section = None
+            current_start = None
     
     # Завершаем последнюю секцию
     if current_section is not None and current_start is not None:
-        last_data_row = len(df) - 1
-        for j in range(len(df) - 1, current_start - 1, -1):
-            row_value = str(df.iloc[j, 0]) if pd.notna(df.iloc[j, 0]) else ""
-            if (row_value and 
-                not row_value.startswith("Итого") and 
-                not row_value.startswith("Дата составления") and
-                len(row_value.strip()) > 0):
-                last_data_row = j
-                break
+        tail = first.iloc[current_start:]
+        is_data = ((tail.str.strip() != "") & ~tail.str.startswith(_NOT_DATA_ROW)).to_numpy(dtype=bool)
+        data_rows = np.flatnonzero(is_data)
+        last_data_row = current_start + int(data_rows[-1]) if len(data_rows) else len(df) - 1
         sections.append((current_section, current_start, last_data_row))
     
     return sections
 
 
-def extract_table_data(df: pd.DataFrame, sections: List[Tuple[str, int, int]]) -> pd.DataFrame:
+def extract_table_data(df: pd.DataFrame, sections: List[Tuple[str, int, int]], verbose: bool = False) -> pd.DataFrame:
     """Извлекает данные из всех секций и объединяет в одну таблицу."""
     
     # хардкод колонки результирующей таблицы
@@ -83,49 +100,67 @@ def extract_table_data(df: pd.DataFrame, sections: List[Tuple[str, int, int]]) -
         "Раздел"
     ]
     
-    all_data = []
+    n_rows = len(df)
+    row_blocks = []
+    name_blocks = []
     
     for section_name, start_idx, end_idx in sections:
-        print(f"Обрабатываем секцию: {section_name} (строки {start_idx}-{end_idx})")
+        if verbose:
+            print(f"Обрабатываем секцию: {section_name} (строки {start_idx}-{end_idx})")
         
-        # Извлекаем данные секции
-        for i in range(start_idx, min(end_idx + 1, len(df))):
-            row = df.iloc[i]
-            
-            # Пропускаем пустые строки
-            if pd.isna(row.iloc[0]) or str(row.iloc[0]).strip() == "":
-                continue
-                
-            cell_value = str(row.iloc[0])
-            if "Итого" in cell_value:
-                continue
-            
-            row_data = []
-            for j in range(6):
-                if j < len(row):
-                    value = row.iloc[j]
-                    if pd.isna(value):
-                        row_data.append("")
-                    else:
-                        clean_value = str(value).strip().strip('"')
-                        row_data.append(clean_value)
-                else:
-                    row_data.append("")
-            
-            row_data.append(section_name)
-            all_data.append(row_data)
+        rows = np.arange(start_idx, min(end_idx + 1, n_rows))
+        row_blocks.append(rows)
+        name_blocks.append(np.full(len(rows), section_name, dtype=object))
     
-    result_df = pd.DataFrame(all_data, columns=columns)
+    rows = np.concatenate(row_blocks) if row_blocks else np.empty(0, dtype=np.intp)
+    
+    # Все строки всех секций берём одним срезом и чистим по колонкам, а не по ячейкам
+    block = df.iloc[rows, :6]
+    cleaned = {}
+    for j, column in enumerate(columns[:6]):
+        if j < block.shape[1]:
+            values = block.iloc[:, j]
+            cleaned[column] = (
+                values.astype(str).str.strip().str.strip('"')
+                .mask(values.isna(), "")
+                .to_numpy(dtype=object)
+            )
+        else:
+            cleaned[column] = np.full(len(rows), "", dtype=object)
+    cleaned["Раздел"] = np.concatenate(name_blocks) if name_blocks else np.empty(0, dtype=object)
+    
+    # Пропускаем пустые строки и итоги
+    first = pd.Series(_first_column(block), dtype=object)
+    keep = ((first.str.strip() != "") & ~first.str.contains("Итого", regex=False)).to_numpy(dtype=bool)
+    
+    result_df = pd.DataFrame({column: values[keep].tolist() for column, values in cleaned.items()}, columns=columns)
     return result_df
 
 
-def analyze_csv_structure(df: pd.DataFrame) -> None:
-    """Анализирует структуру CSV файла."""
+def read_statement_csv(input_file: str, usecols: Optional[List[int]] = None) -> pd.DataFrame:
+    """Читает CSV выписки как строки: пустые ячейки остаются пустыми строками, а не NaN."""
+    
+    return pd.read_csv(
+        input_file, encoding='utf-8', usecols=usecols,
+        dtype=str, keep_default_na=False, na_filter=False, engine='c'
+    )
+
+
+def analyze_csv_structure(df: pd.DataFrame, sections: Optional[List[Tuple[str, int, int]]] = None,
+                          n_columns: Optional[int] = None) -> None:
+    """Анализирует структуру CSV файла.
+    
+    Для поиска секций нужна только первая колонка, поэтому df может быть прочитан
+    лишь с ней - тогда ширину файла передают в n_columns.
+    """
     
-    print(f"Размер файла: {df.shape[0]} строк, {df.shape[1]} колонок")
+    if n_columns is None:
+        n_columns = df.shape[1]
+    print(f"Размер файла: {df.shape[0]} строк, {n_columns} колонок")
     print("\nАнализ структуры:")
     
-    sections = find_table_sections(df)
+    if sections is None:
+        sections = find_table_sections(df)
     print(f"\nНайдено секций: {len(sections)}")
     
     total_records = 0
@@ -137,8 +172,12 @@ def analyze_csv_structure(df: pd.DataFrame) -> None:
     print(f"\nОбщее количество записей для обработки: {total_records}")
 
 
-def merge_csv_tables(input_file: str, output_file: str = None) -> str:
-    """Основная функция объединения таблиц."""
+def merge_csv_tables(input_file: str, output_file: str = None, verbose: bool = False) -> str:
+    """Основная функция объединения таблиц.
+    
+    Ход работы печатается только при verbose=True - по умолчанию функция молчит,
+    чтобы пакетная обработка выписок не упиралась в вывод в stdout.
+    """
     
     input_path = Path(input_file)
     if not input_path.exists():
@@ -147,43 +186,52 @@ def merge_csv_tables(input_file: str, output_file: str = None) -> str:
     if output_file is None:
         output_file = str(input_path.with_suffix('').with_suffix('')) + '_clean.csv'
     
-    print(f"Читаем файл: {input_file}")
-    df = pd.read_csv(input_file, encoding='utf-8')
-    
-    analyze_csv_structure(df)
+    if verbose:
+        print(f"Читаем файл: {input_file}")
+    df = read_statement_csv(input_file)
     
+    # Секции ищем один раз и для анализа, и для объединения
     sections = find_table_sections(df)
+    if verbose:
+        analyze_csv_structure(df, sections)
+    
     if not sections:
         raise ValueError("Не найдено секций с данными для объединения")
     
-    print("\nОбъединяем таблицы...")
-    merged_df = extract_table_data(df, sections)
+    if verbose:
+        print("\nОбъединяем таблицы...")
+    merged_df = extract_table_data(df, sections, verbose)
     
-    print(f"Сохраняем в файл: {output_file}")
+    if verbose:
+        print(f"Сохраняем в файл: {output_file}")
     merged_df.to_csv(output_file, encoding='utf-8', index=False)
     
-    print(f"\nГотово! Объединено {len(merged_df)} записей из {len(sections)} секций")
-    print(f"Результат сохранён в: {output_file}")
+    if verbose:
+        print(f"\nГотово! Объединено {len(merged_df)} записей из {len(sections)} секций")
+        print(f"Результат сохранён в: {output_file}")
+        print_merge_statistics(merged_df)
     
     return output_file
+
+
+def print_merge_statistics(merged_df: pd.DataFrame) -> None:
+    """Выводит статистику по объединённой таблице."""
     
     # Статистика по разделам
-    if 'Раздел' in df.columns:
-        print(f"\nРаспределение по разделам:")
-        section_counts = df['Раздел'].value_counts()
-        for section, count in section_counts.items():
-            print(f"  {section}: {count} записей")
+    print(f"\nРаспределение по разделам:")
+    section_counts = merged_df['Раздел'].value_counts()
+    for section, count in section_counts.items():
+        print(f"  {section}: {count} записей")
     
     # Статистика по типам ценных бумаг
-    if 'Наименование Ценной Бумаги' in df.columns:
-        print(f"\nТипы ценных бумаг:")
-        security_types = df['Наименование Ценной Бумаги'].value_counts().head(10)
-        for sec_type, count in security_types.items():
-            print(f"  {sec_type}: {count}")
+    print(f"\nТипы ценных бумаг:")
+    security_types = merged_df['Наименование Ценной Бумаги'].value_counts().head(10)
+    for sec_type, count in security_types.items():
+        print(f"  {sec_type}: {count}")
     
     # Показываем первые несколько записей
     print(f"\nПервые 5 записей:")
-    print(df.head().to_string())
+    print(merged_df.head().to_string())
 
 
 def main():
@@ -221,10 +269,12 @@ def main():
     
     try:
         if args.analyze:
-            df = pd.read_csv(args.input_file, encoding='utf-8')
-            analyze_csv_structure(df)
+            # Для анализа читаем только первую колонку, а ширину берём из заголовка
+            n_columns = len(pd.read_csv(args.input_file, encoding='utf-8', nrows=0).columns)
+            df = read_statement_csv(args.input_file, usecols=[0])
+            analyze_csv_structure(df, n_columns=n_columns)
         else:
-            merge_csv_tables(args.input_file, args.output_file)
+            merge_csv_tables(args.input_file, args.output_file, verbose=True)
     except Exception as e:
         print(f"Ошибка: {e}", file=sys.stderr)
         sys.exit(1)
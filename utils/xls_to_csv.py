@@ -1,18 +1,82 @@
 #!/usr/bin/env python3
+import csv
+import io
+import json
+import os
 import sys
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import lru_cache
+from itertools import repeat
 import argparse
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Sequence, TextIO, Tuple
+
+# pandas импортируется лениво: --help и ошибки аргументов/путей обходятся без его загрузки
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+except ImportError:  # Нет колеса calamine для платформы - используем openpyxl
+    python_calamine = None
+
+
+# calamine (Rust) читает и старый .xls, и .xlsx/.xlsb заметно быстрее xlrd/openpyxl.
+# Без calamine движок выбирается по расширению файла (см. _resolve_engine)
+DEFAULT_ENGINE: Optional[str] = 'calamine' if python_calamine is not None else None
+
+# Форматы, которые умеет открывать openpyxl; старый .xls читает только xlrd
+_OPENPYXL_SUFFIXES = ('.xlsx', '.xlsm')
+
+# Буфер записи CSV: крупные блоки вместо множества мелких системных вызовов write
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Сколько строк сериализуется в CSV за раз - ограничивает промежуточную память на больших листах
+DEFAULT_CHUNKSIZE = 100_000
 
 
 def convert_xls_to_csv(
     input_file: str, 
     output_file: Optional[str] = None,
     sheet_name: str = 'Account_Statement_auto_EXC',
-    encoding: str = 'utf-8-sig'
+    encoding: str = 'utf-8-sig',
+    engine: Optional[str] = DEFAULT_ENGINE,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    usecols: Optional[str] = None,
+    dtype: Optional[Dict[str, str]] = None,
+    verbose: bool = True,
+    output_format: str = 'csv'
 ) -> str:
-    """Конвертирует XLS файл в CSV формат."""
+    """Конвертирует XLS файл в CSV формат.
+    
+    usecols - колонки в нотации Excel ("A:C,E"), dtype - типы колонок по именам;
+    чем уже выборка, тем быстрее разбор листа при любом движке.
+    При output_format='parquet' пишется Parquet (нужен pyarrow или fastparquet).
+    """
+    
+    output_file, _, _ = _convert_xls_to_csv(
+        input_file, output_file, sheet_name, encoding, engine, buffer_size, chunksize, usecols, dtype, verbose,
+        output_format
+    )
+    return output_file
+
+
+def _convert_xls_to_csv(
+    input_file: str,
+    output_file: Optional[str],
+    sheet_name: str,
+    encoding: str,
+    engine: Optional[str] = DEFAULT_ENGINE,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    usecols: Optional[str] = None,
+    dtype: Optional[Dict[str, str]] = None,
+    verbose: bool = True,
+    output_format: str = 'csv'
+) -> Tuple[str, int, int]:
+    """Конвертирует XLS в CSV и возвращает путь к CSV и размер данных (строки, колонки)."""
     
     input_path = Path(input_file)
     
@@ -20,59 +84,277 @@ def convert_xls_to_csv(
         raise FileNotFoundError(f"Файл {input_file} не найден")
     
     if output_file is None:
-        output_file = str(input_path.with_suffix('.csv'))
+        output_file = str(input_path.with_suffix(f'.{output_format}'))
+    
+    engine = _resolve_engine(input_file, engine)
     
     try:
-        print(f"Читаем XLS файл: {input_file}")
-        df = pd.read_excel(input_file, sheet_name=sheet_name)
-        
-        print(f"Найдено {len(df)} строк и {len(df.columns)} колонок")
+        if verbose:
+            print(f"Читаем XLS файл: {input_file}")
+            print(f"Сохраняем в {output_format.upper()} файл: {output_file}")
         
-        print(f"Сохраняем в CSV файл: {output_file}")
-        df.to_csv(output_file, index=False, encoding=encoding)
+        if output_format == 'parquet':
+            df = _read_sheet(input_file, sheet_name, engine, usecols, dtype)
+            # В колонках выписки текст соседствует с числами, а Parquet хранит один тип на колонку
+            mixed_columns = [column for column, column_dtype in df.dtypes.items() if column_dtype == object]
+            df.astype({column: 'string' for column in mixed_columns}).to_parquet(
+                output_file, index=False, compression='snappy'
+            )
+            n_rows, n_cols = len(df), len(df.columns)
+        else:
+            n_rows, n_cols = _write_csv(
+                input_file, output_file, sheet_name, encoding, engine, buffer_size, chunksize, usecols, dtype
+            )
         
-        print(f"✅ Конвертация завершена успешно!")
-        print(f"   Входной файл: {input_file}")
-        print(f"   Выходной файл: {output_file}")
-        print(f"   Размер данных: {len(df)} строк x {len(df.columns)} колонок")
+        if verbose:
+            print(f"✅ Конвертация завершена успешно!")
+            print(f"   Входной файл: {input_file}")
+            print(f"   Выходной файл: {output_file}")
+            print(f"   Размер данных: {n_rows} строк x {n_cols} колонок")
         
-        return str(output_file)
+        return str(output_file), n_rows, n_cols
         
     except Exception as e:
         raise ValueError(f"Ошибка при обработке файла {input_file}: {str(e)}")
 
 
-def analyze_xls_structure(input_file: str, sheet_name: str = 'Account_Statement_auto_EXC'):
+def _write_csv(
+    input_file: str,
+    output_file: str,
+    sheet_name: str,
+    encoding: str,
+    engine: Optional[str],
+    buffer_size: int,
+    chunksize: int,
+    usecols: Optional[str],
+    dtype: Optional[Dict[str, str]]
+) -> Tuple[int, int]:
+    """Пишет лист в CSV и возвращает размер данных (строки, колонки).
+    
+    CSV пишется во временный файл рядом с output_file и подменяет его только после успешной записи,
+    чтобы ошибка чтения книги не затирала уже существующий CSV.
+    """
+    
+    output_path = Path(output_file)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    
+    try:
+        with open(tmp_path, 'x', encoding=encoding, newline='', buffering=buffer_size) as fh:
+            if engine in _STREAMING_ENGINES and usecols is None and dtype is None:
+                # Строки листа сразу пишем в CSV, не собирая DataFrame целиком;
+                # выбор колонок и типов разбирает pandas, поэтому с ними идём через DataFrame
+                n_rows, n_cols = _write_rows_to_csv(_iter_sheet_rows(input_file, sheet_name, engine), fh, chunksize)
+            else:
+                df = _read_sheet(input_file, sheet_name, engine, usecols, dtype)
+                df.to_csv(fh, index=False, chunksize=chunksize)
+                n_rows, n_cols = len(df), len(df.columns)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return n_rows, n_cols
+
+
+def _read_sheet(
+    input_file: str,
+    sheet_name: str,
+    engine: Optional[str],
+    usecols: Optional[str] = None,
+    dtype: Optional[Dict[str, str]] = None
+) -> 'pd.DataFrame':
+    """Читает лист в DataFrame; повторное чтение неизменённого файла берётся из кеша."""
+    
+    path = Path(input_file).resolve()
+    dtype_key = tuple(sorted(dtype.items())) if dtype else None
+    return _read_sheet_cached(str(path), sheet_name, engine, usecols, dtype_key, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _read_sheet_cached(
+    path: str,
+    sheet_name: str,
+    engine: Optional[str],
+    usecols: Optional[str],
+    dtype_key: Optional[Tuple[Tuple[str, str], ...]],
+    mtime_ns: int
+) -> 'pd.DataFrame':
+    import pandas as pd
+    
+    # mtime_ns входит в ключ кеша, чтобы изменённый файл перечитывался.
+    # Результат общий для всех вызывающих - не изменять
+    dtype = dict(dtype_key) if dtype_key else None
+    with pd.ExcelFile(path, engine=engine) as workbook:
+        sheet_name = _pick_sheet(workbook.sheet_names, sheet_name, path)
+        return workbook.parse(sheet_name, usecols=usecols, dtype=dtype)
+
+
+def _resolve_engine(input_file: str, engine: Optional[str]) -> Optional[str]:
+    """Возвращает движок для файла: явно заданный, иначе openpyxl в режиме read_only для .xlsx.
+    
+    Для .xls и прочих форматов возвращает None - pandas сам выберет движок (xlrd для .xls).
+    """
+    
+    if engine is not None:
+        return engine
+    return 'openpyxl' if Path(input_file).suffix.lower() in _OPENPYXL_SUFFIXES else None
+
+
+def _pick_sheet(sheet_names: Sequence[str], sheet_name: str, input_file: str) -> str:
+    """Возвращает нужный лист, а если его нет в книге - первый лист с предупреждением."""
+    
+    if sheet_name in sheet_names or not sheet_names:
+        return sheet_name
+    
+    print(f"⚠️  В файле {input_file} нет листа '{sheet_name}', читаем первый лист '{sheet_names[0]}'",
+          file=sys.stderr)
+    return sheet_names[0]
+
+
+# Движки, лист которых можно читать построчно без pandas
+_STREAMING_ENGINES = ('calamine', 'openpyxl')
+
+
+def _iter_sheet_rows(input_file: str, sheet_name: str, engine: str) -> Iterator[Sequence[Any]]:
+    """Построчно читает лист книги: значения ячеек, пустые ячейки - None или ''."""
+    
+    if engine == 'calamine':
+        from python_calamine import CalamineWorkbook
+        
+        workbook = CalamineWorkbook.from_path(input_file)
+        try:
+            sheet_name = _pick_sheet(workbook.sheet_names, sheet_name, input_file)
+            # Пустую область в начале листа не пропускаем, иначе колонки сдвигаются относительно pandas
+            yield from workbook.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+        finally:
+            workbook.close()
+    else:
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(input_file, read_only=True, data_only=True)
+        try:
+            sheet_name = _pick_sheet(workbook.sheetnames, sheet_name, input_file)
+            yield from workbook[sheet_name].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+def _csv_value(value: Any) -> Any:
+    # Как и pandas, пишем целые числа без дробной части: 100, а не 100.0
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _write_rows_to_csv(rows: Iterator[Sequence[Any]], fh: TextIO,
+                       chunksize: int = DEFAULT_CHUNKSIZE) -> Tuple[int, int]:
+    """Пишет строки листа в CSV и возвращает размер данных (строки без заголовка, колонки).
+    
+    Раскладка та же, что у pd.read_excel + to_csv: первая строка - заголовок с "Unnamed: N"
+    вместо пустых имён, пустые строки в конце листа отбрасываются.
+    """
+    
+    rows = iter(rows)
+    n_rows = 0
+    n_cols = 0
+    blank_rows = []
+    batch = []
+    writer = csv.writer(fh, lineterminator='\n')
+    
+    header = next(rows, None)
+    if header is not None:
+        n_cols = len(header)
+        writer.writerow([
+            f"Unnamed: {i}" if _csv_value(value) == "" else _csv_value(value)
+            for i, value in enumerate(header)
+        ])
+    
+    for row in rows:
+        values = [_csv_value(value) for value in row]
+        if all(value == "" for value in values):
+            # Пустые строки пишем только если после них будут данные
+            blank_rows.append(values)
+            continue
+        if blank_rows:
+            batch.extend(blank_rows)
+            blank_rows.clear()
+        batch.append(values)
+        
+        if len(batch) >= chunksize:
+            writer.writerows(batch)
+            n_rows += len(batch)
+            batch.clear()
+    
+    writer.writerows(batch)
+    n_rows += len(batch)
+    
+    return n_rows, n_cols
+
+def analyze_xls_structure(input_file: str, sheet_name: str = 'Account_Statement_auto_EXC',
+                          engine: Optional[str] = DEFAULT_ENGINE):
     """Анализирует структуру XLS файла и выводит информацию о данных."""
     
+    # Отчёт собирается в буфер и выводится одной записью, а не print на каждую колонку
+    report = io.StringIO()
+    
     try:
-        print(f"\n=== АНАЛИЗ СТРУКТУРЫ ФАЙЛА {input_file} ===")
+        print(f"\n=== АНАЛИЗ СТРУКТУРЫ ФАЙЛА {input_file} ===", file=report)
         
-        df = pd.read_excel(input_file, sheet_name=sheet_name)
+        df = _read_sheet(input_file, sheet_name, _resolve_engine(input_file, engine))
         
-        print(f"Размер данных: {len(df)} строк x {len(df.columns)} колонок")
-        print(f"Лист: {sheet_name}")
+        print(f"Размер данных: {len(df)} строк x {len(df.columns)} колонок", file=report)
+        print(f"Лист: {sheet_name}", file=report)
         
-        print(f"\nЗаголовки колонок:")
-        for i, col in enumerate(df.columns):
-            print(f"  {i}: {col}")
+        print(f"\nЗаголовки колонок:", file=report)
+        report.writelines(f"  {i}: {col}\n" for i, col in enumerate(df.columns))
         
-        print(f"\nПервые 5 строк данных:")
-        print(df.head().to_string())
+        print(f"\nПервые 5 строк данных:", file=report)
+        print(df.head().to_string(), file=report)
         
         # Показываем только колонки с пустыми значениями
-        print(f"\nИнформация о пустых значениях:")
+        print(f"\nИнформация о пустых значениях:", file=report)
         null_counts = df.isnull().sum()
-        for col, count in null_counts.items():
-            if count > 0:
-                print(f"  {col}: {count} пустых значений")
+        null_counts = null_counts[null_counts > 0]
+        report.writelines(f"  {col}: {count} пустых значений\n" for col, count in null_counts.items())
         
-        print(f"\nТипы данных:")
-        for col, dtype in df.dtypes.items():
-            print(f"  {col}: {dtype}")
+        print(f"\nТипы данных:", file=report)
+        report.writelines(f"  {col}: {dtype}\n" for col, dtype in df.dtypes.items())
             
     except Exception as e:
-        print(f"❌ Ошибка при анализе файла: {str(e)}")
+        print(f"❌ Ошибка при анализе файла: {str(e)}", file=report)
+    
+    sys.stdout.write(report.getvalue())
+
+def _convert_in_worker(input_file: str, options: Dict[str, Any]) -> Tuple[str, bool]:
+    """Конвертирует файл в процессе пула; вывод возвращает текстом, чтобы отчёты не перемешивались."""
+    
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            _convert_xls_to_csv(input_file, None, **options)
+            ok = True
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ Ошибка: {str(e)}")
+            ok = False
+    return output.getvalue(), ok
+
+
+def convert_many(input_files: Sequence[str], **options: Any) -> bool:
+    """Конвертирует несколько файлов параллельно, по процессу на файл (не больше числа ядер).
+    
+    Разбор Excel нагружает CPU и держит GIL, поэтому файлы обрабатываются в отдельных процессах.
+    Отчёты печатаются в порядке файлов; возвращает True, если все конвертации успешны.
+    """
+    
+    max_workers = min(len(input_files), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_convert_in_worker, input_files, repeat(options)))
+    
+    for output, _ in results:
+        print(output, end='')
+    return all(ok for _, ok in results)
 
 
 def main():
@@ -84,21 +366,26 @@ def main():
         epilog="""
 Примеры использования:
   python xls_to_csv.py statement_sign.xls
-  python xls_to_csv.py statement_sign.xls output.csv
+  python xls_to_csv.py statement_sign.xls -o output.csv
+  python xls_to_csv.py statement_2023.xls statement_2024.xls statement_2025.xls
   python xls_to_csv.py statement_sign.xls --analyze
   python xls_to_csv.py statement_sign.xls --sheet "Other_Sheet"
+  python xls_to_csv.py statement_sign.xls --engine xlrd
+  python xls_to_csv.py statement_sign.xls --usecols "A:F" --dtypes '{"ISIN": "str"}'
+  python xls_to_csv.py statement_sign.xls --format parquet
         """
     )
     
     parser.add_argument(
         'input_file',
-        help='Путь к входному XLS файлу'
+        nargs='+',
+        help='Путь к входному XLS файлу или несколько файлов (конвертируются параллельно)'
     )
     
     parser.add_argument(
-        'output_file',
-        nargs='?',
-        help='Путь к выходному CSV файлу (опционально)'
+        '-o', '--output',
+        dest='output_file',
+        help='Путь к выходному CSV файлу (опционально, только для одного входного файла)'
     )
     
     parser.add_argument(
@@ -113,6 +400,53 @@ def main():
         help='Кодировка для CSV файла (по умолчанию: utf-8-sig)'
     )
     
+    parser.add_argument(
+        '--buffer-size',
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help=f'Размер буфера записи CSV в байтах (по умолчанию: {DEFAULT_BUFFER_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help=f'Сколько строк записывать в CSV за раз (по умолчанию: {DEFAULT_CHUNKSIZE})'
+    )
+    
+    parser.add_argument(
+        '--usecols',
+        help='Читать только эти колонки, в нотации Excel: "A:C,E" (по умолчанию: все)'
+    )
+    
+    parser.add_argument(
+        '--dtypes',
+        type=json.loads,
+        help='Типы колонок в JSON, например \'{"ISIN": "str"}\' - pandas не будет их угадывать'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        default=DEFAULT_ENGINE,
+        choices=['calamine', 'openpyxl', 'xlrd', 'pyxlsb'],
+        help='Движок pandas для чтения Excel (по умолчанию: calamine, без него - openpyxl для .xlsx '
+             'и движок pandas по умолчанию для .xls)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=['csv', 'parquet'],
+        default='csv',
+        help='Формат результата (по умолчанию: csv); для parquet нужен pyarrow или fastparquet'
+    )
+    
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Не выводить ход конвертации и краткий анализ, только ошибки'
+    )
+    
     parser.add_argument(
         '--analyze',
         action='store_true',
@@ -121,23 +455,52 @@ def main():
     
     args = parser.parse_args()
     
+    input_files = args.input_file
+    if args.output_file is not None and len(input_files) > 1:
+        parser.error('--output можно указать только для одного входного файла')
+    args.input_file = input_files[0]
+    
     try:
         if args.analyze:
-            # Только анализ структуры
-            analyze_xls_structure(args.input_file, args.sheet)
+            # Только анализ структуры; файлы по очереди, чтобы не перемешать вывод
+            for input_file in input_files:
+                analyze_xls_structure(input_file, args.sheet, args.engine)
+        elif len(input_files) > 1:
+            ok = convert_many(
+                input_files,
+                sheet_name=args.sheet,
+                encoding=args.encoding,
+                engine=args.engine,
+                buffer_size=args.buffer_size,
+                chunksize=args.chunksize,
+                usecols=args.usecols,
+                dtype=args.dtypes,
+                verbose=not args.quiet,
+                output_format=args.output_format
+            )
+            if not ok:
+                sys.exit(1)
         else:
             # Конвертация в CSV
-            output_file = convert_xls_to_csv(
+            # Размер данных известен после конвертации - CSV повторно не читаем
+            output_file, n_rows, n_cols = _convert_xls_to_csv(
                 args.input_file,
                 args.output_file,
                 args.sheet,
-                args.encoding
+                args.encoding,
+                args.engine,
+                args.buffer_size,
+                args.chunksize,
+                args.usecols,
+                args.dtypes,
+                not args.quiet,
+                args.output_format
             )
             
             # Также показываем краткий анализ
-            print(f"\n=== КРАТКИЙ АНАЛИЗ КОНВЕРТИРОВАННЫХ ДАННЫХ ===")
-            df = pd.read_csv(output_file, encoding=args.encoding)
-            print(f"CSV файл содержит: {len(df)} строк x {len(df.columns)} колонок")
+            if not args.quiet:
+                print(f"\n=== КРАТКИЙ АНАЛИЗ КОНВЕРТИРОВАННЫХ ДАННЫХ ===")
+                print(f"{args.output_format.upper()} файл содержит: {n_rows} строк x {n_cols} колонок")
             
     except (FileNotFoundError, ValueError) as e:
         print(f"❌ Ошибка: {str(e)}")